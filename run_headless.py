@@ -0,0 +1,11 @@
+from uc480.core.headless import run_job
+
+if __name__ == '__main__':
+
+    import sys
+    from lantz.core.log import log_to_screen, INFO
+
+    log_to_screen(INFO)
+
+    job_path = sys.argv[1] if len(sys.argv) > 1 else None
+    run_job(job_path)
@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
 
-from . import core
-from . import utilities
-from . import config
\ No newline at end of file
+from importlib import import_module
+
+# Imported on first access, so that the standalone modules (uc480.utilities.shm, uc480.utilities.stream) can be used
+# from analysis scripts without the camera driver and Qt stack that uc480.core loads
+_SUBPACKAGES = ('core', 'utilities', 'config')
+
+
+def __getattr__(name):
+    if name in _SUBPACKAGES:
+        return import_module('.' + name, __name__)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
@@ -3,4 +3,5 @@
 from os.path import abspath, dirname, join
 
 THIS_PATH = abspath(dirname(__file__))
-CONFIG_DEFAULT = join(THIS_PATH, 'default.yaml')
\ No newline at end of file
+CONFIG_DEFAULT = join(THIS_PATH, 'default.yaml')
+JOB_DEFAULT = join(THIS_PATH, 'job_default.yaml')
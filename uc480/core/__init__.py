@@ -1,11 +1,45 @@
 # -*- coding: utf-8 -*-
 
+from importlib import import_module
+
 from .driver import Camera # Keep this first
-from .camera import CameraControl, CameraControlUi, CameraSave, CameraSaveUi, ImageViewerUi
-from .spectra import SpectraAnalyzer, SpectraAnalyzerUi, SpectraSave, SpectraSaveUi, SpectraViewerUi
-from .fft import FFTAnalyzer, FFTAnalyzerUi, FFTViewerUi
-from .app import Main, MainUi, CameraMain, CameraMainUi, CameraSaveMainUi, SpectraMainUi # Keep this last
 
 from lantz.core import ureg
 
-Q = ureg.Quantity
\ No newline at end of file
+Q = ureg.Quantity
+
+# The driver is loaded eagerly and first; backends and frontends are imported on first access, so that the headless
+# runner (uc480.core.headless) never loads the Ui classes and the main window in app.py
+_MODULES = ('camera', 'spectra', 'fft', 'headless', 'app')
+
+_NAMES = {'CameraControl': 'camera',
+          'CameraControlUi': 'camera',
+          'CameraSave': 'camera',
+          'CameraSaveUi': 'camera',
+          'ImageViewerUi': 'camera',
+          'SpectraAnalyzer': 'spectra',
+          'SpectraAnalyzerUi': 'spectra',
+          'SpectraSave': 'spectra',
+          'SpectraSaveUi': 'spectra',
+          'SpectraViewerUi': 'spectra',
+          'FFTAnalyzer': 'fft',
+          'FFTAnalyzerUi': 'fft',
+          'FFTViewerUi': 'fft',
+          'HeadlessRunner': 'headless',
+          'load_job': 'headless',
+          'run_job': 'headless',
+          'Main': 'app',
+          'MainUi': 'app',
+          'CameraMain': 'app',
+          'CameraMainUi': 'app',
+          'CameraSaveMainUi': 'app',
+          'SpectraMainUi': 'app'}
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return import_module('.' + name, __name__)
+    if name in _NAMES:
+        return getattr(import_module('.' + _NAMES[name], __name__), name)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
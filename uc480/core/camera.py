@@ -8,7 +8,12 @@ Created on Thu Mar 28 13:01:25 2019
 from .driver import Camera
 from uc480.config import CONFIG_DEFAULT
 from uc480.utilities import file_dialog_save
-from uc480.utilities.save import SaveManager, PATH, DATA, TRIGGER_RETURN, INSTANCE_ATTRIBUTE, Numerations, StopConditions
+from uc480.utilities.save import SaveManager, PATH, DATA, METADATA, TRIGGER_RETURN, INSTANCE_ATTRIBUTE, Numerations, StopConditions
+from uc480.utilities.metrics import PipelineMonitor
+from uc480.utilities.shm import SharedFrameWriter
+from uc480.utilities.stats import ThrottledStatistics
+from uc480.utilities.compression import benchmark, select_codec, candidate_codecs, synthetic_frames
+from uc480.utilities.writers import HDF5FrameWriter, RawFrameWriter, TiffFrameWriter, write_text
 from uc480.utilities.enums import ImageColorMode, ShutterModes, BlacklevelModes, EnumMixin
 
 from lantz.qt.app import Backend, Frontend, InstrumentSlot, QtCore
@@ -22,9 +27,7 @@ from re import split
 
 from enum import Enum, EnumMeta
 
-from time import monotonic
-
-from pyqtgraph import ImageView
+from time import monotonic, perf_counter, time
 
 from yaml import safe_load, YAMLError, dump
 
@@ -38,6 +41,7 @@ class CameraControl(Backend):
     view = QtCore.pyqtSignal(object)
     
     aoi_changed = QtCore.pyqtSignal(object)
+    stats = QtCore.pyqtSignal(object)
     
     class _outputs(Enum):
         FRAME = 'frame'
@@ -56,13 +60,27 @@ class CameraControl(Backend):
         super().__init__(*args, **kwargs)
         
         self._last_frame = None
+        self._last_acquire_time = None
+        self._last_device_time = None
+        self._device_timestamp = True
+        # When enabled the device timestamp is read once per frame, for lost frame counting and the CameraSave metadata
+        self.device_timestamps = False
         self._averages = 1
+        self._exposure = self.camera.exposure.to('ms').magnitude
+        self._frame_rate = self.camera.frame_rate.to('Hz').magnitude
+        self.shared_memory = None
+        self.statistics = None
         
         try:
             current_frame_interval = 1/self.camera.frame_rate
         except ZeroDivisionError:
             current_frame_interval = 0 * ureg.ms
         
+        # Shared with every backend downstream (spectra, FFT, save managers)
+        self.monitor = PipelineMonitor()
+        self.monitor.set_frame_interval(current_frame_interval)
+        self.metrics = self.monitor.stage('acquisition')
+        
         self.output = self._outputs.FRAME
         self.timer = QtCore.QTimer()
         self.timer.setInterval(current_frame_interval.to('ms').magnitude)
@@ -115,6 +133,9 @@ class CameraControl(Backend):
         
     def acquire(self):
         try:
+            start = self.metrics.begin()
+            self.count_lost_frames(start)
+            
             if self.averages > 1:
                 image = self.camera.get_frame() / self.averages
                 
@@ -124,13 +145,100 @@ class CameraControl(Backend):
                 image = self.camera.get_frame()
             
             self._last_frame = image
+            self.metrics.end(start)
+            
+            if self.shared_memory is not None:
+                self.shared_memory.write(image, timestamp=time(), exposure=self._exposure)
+            
+            if self.statistics is not None:
+                stats = self.statistics.update(image)
+                if stats is not None:
+                    self.stats.emit(stats)
+            
             self.send_output(image, self._outputs.FRAME)
         
         except KeyboardInterrupt:
             self.start_stop(False)
     
+    def enable_shared_memory(self, name='uc480_frames', slots=8):
+        """
+        Publica cada cuadro adquirido en un anillo de memoria compartida de nombre `name`, que otros procesos pueden
+        leer con `uc480.utilities.shm.SharedFrameReader`. Cada posición tiene lugar para un cuadro del tamaño máximo
+        del sensor en punto flotante (el tipo de dato cuando se promedia o se corrige el dark).
+        """
+        self.disable_shared_memory()
+        
+        max_width = self.camera.sensor_info.max_width
+        max_height = self.camera.sensor_info.max_height
+        slot_capacity = max_width * max_height * np.dtype(np.float64).itemsize
+        
+        self._exposure = self.camera.exposure.to('ms').magnitude
+        self.shared_memory = SharedFrameWriter(name, slot_capacity=slot_capacity, slots=slots)
+        self.log_debug("Publishing frames to shared memory '{}' ({} slots)".format(name, slots))
+    
+    def disable_shared_memory(self):
+        if self.shared_memory is not None:
+            self.shared_memory.close()
+            self.shared_memory = None
+            self.log_debug("Shared memory frame publishing stopped")
+    
+    def enable_stats(self, stride=4, interval=0.2, bins=64):
+        """
+        Calcula media, mínimo, máximo, píxeles saturados e histograma de los cuadros adquiridos, sobre una submuestra de
+        uno de cada `stride` píxeles por eje, y los emite por la señal `stats` como máximo una vez cada `interval`
+        segundos. Ver `uc480.utilities.stats.FrameStatistics`.
+        """
+        self.statistics = ThrottledStatistics(interval=interval, bit_depth=self.get_bit_depth(), stride=stride,
+                                              bins=bins)
+        self.log_debug("Frame statistics enabled (stride {}, interval {} s)".format(stride, interval))
+    
+    def disable_stats(self):
+        if self.statistics is not None:
+            self.statistics = None
+            self.log_debug("Frame statistics disabled")
+    
+    def get_device_timestamp(self):
+        if self._device_timestamp:
+            try:
+                return self.camera.get_device_timestamp()
+            except Exception:
+                # Not every camera model supports image info: stop asking after the first failure
+                self._device_timestamp = False
+                self.log_debug("Device timestamps are not available, lost frames are estimated from the host clock")
+        
+        return None
+    
+    def count_lost_frames(self, now=None):
+        # Frames are polled at the frame interval, so the frames produced
+        # between two reads beyond the first one were never read
+        if now is None:
+            now = perf_counter()
+        
+        budget = self.monitor.budget
+        device_time = self.get_device_timestamp() if self.device_timestamps else None
+        
+        if device_time is not None:
+            # The camera clock stamps every exposure, so the frame count
+            # between two reads is exact up to rounding
+            if self._last_device_time is not None and budget:
+                lost = int(round((device_time - self._last_device_time) / budget)) - 1
+                if lost > 0:
+                    self.metrics.drop(lost)
+        elif self._last_acquire_time is not None and budget:
+            # The host clock includes the timer jitter: only whole frame
+            # intervals beyond the expected one are counted as lost
+            lost = int(np.floor((now - self._last_acquire_time) / budget)) - 1
+            if lost > 0:
+                self.metrics.drop(lost)
+        
+        # Cached for the frame about to be read, so that nobody else asks the driver again
+        self._last_device_time = device_time
+        self._last_acquire_time = now
+    
     def start_stop(self, value):
         if value:
+            self._last_acquire_time = None
+            self._last_device_time = None
             self.camera.start_video_capture()
             self.timer.start()
             self.started.emit()
@@ -152,14 +260,17 @@ class CameraControl(Backend):
     def set_frame_rate(self, value):
         self.camera.frame_rate = value
         current_frame_rate = self.camera.frame_rate
+        self._frame_rate = current_frame_rate.to('Hz').magnitude
         interval = int((1/current_frame_rate).to('ms').magnitude)
         
         self.timer.setInterval(interval)
+        self.monitor.set_frame_interval(1/current_frame_rate)
         
         return current_frame_rate
     
     def set_exposure(self, value):
         self.camera.exposure = value
+        self._exposure = self.camera.exposure.to('ms').magnitude
         
         return self.camera.exposure
     
@@ -209,6 +320,9 @@ class CameraControl(Backend):
             raise ValueError("Invalid bit depth value")
         
         self.camera.color_mode = color_mode
+        
+        if self.statistics is not None:
+            self.statistics.bit_depth = value
     
     def get_shutter_mode(self):
         return self.camera.shutter_mode
@@ -599,6 +713,8 @@ class CameraSave(SaveManager, Backend):
         TIFF = 'tiff'
         IMAGE = "image"
         TXT = 'plain text'
+        HDF5 = 'hdf5'
+        RAW = 'raw stream'
     
     class _formats(Enum):
         INTEGER = "%0.1i"
@@ -606,9 +722,25 @@ class CameraSave(SaveManager, Backend):
     
     DELIMITER = "\t"
     
+    # Per-frame metadata, stored next to the frames by the single-file modes
+    METADATA_DTYPE = np.dtype([('sequence', '<u8'),
+                               ('device_timestamp', '<f8'),
+                               ('timestamp', '<f8'),
+                               ('exposure', '<f8'),
+                               ('frame_rate', '<f8'),
+                               ('aoi', '<u4', (4,)),
+                               ('dark_correction', '?'),
+                               ('gain_correction', '?'),
+                               ('averages', '<u4')])
+    
     def __init__(self, camera_control_be: CameraControl, mode="numpy binary"):
         
         self.camera_control_be = camera_control_be
+        self.writer = None
+        self.compression = None
+        self.compression_opts = None
+        self.chunk_frames = None
+        self.codec = None
         self.mode = mode
         
         super().__init__(self.callback,
@@ -619,7 +751,17 @@ class CameraSave(SaveManager, Backend):
                          append='timestamp',
                          single_file=False)
         
-        self.callback_args = (PATH(), DATA())
+        self._selected_codec = None
+        self._aoi_limits = None
+        self._device_timestamps = False
+        self.callback_args = (PATH(), DATA(), METADATA())
+        self.set_metadata(self.METADATA_DTYPE, self.get_frame_metadata)
+        self.set_monitor(camera_control_be.monitor, 'camera_save')
+        
+        self.started.connect(self.close_writer)
+        self.stopped.connect(self.close_writer)
+        self.started.connect(self.prepare_metadata)
+        self.stopped.connect(self.release_metadata)
     
     @property
     def mode(self):
@@ -644,6 +786,10 @@ class CameraSave(SaveManager, Backend):
             self.callback = self.save_tiff
         elif value == self._modes.IMAGE:
             self.callback = self.save_image
+        elif value == self._modes.HDF5:
+            self.callback = self.save_hdf5
+        elif value == self._modes.RAW:
+            self.callback = self.save_raw
     
     def initialize_buffer(self):
         if isinstance(self.camera_control_be.last_frame, type(None)):
@@ -656,24 +802,173 @@ class CameraSave(SaveManager, Backend):
         else:
             init_object = self.camera_control_be.last_frame
         
-        self.buffer.init_object = init_object
-    
-    def save_txt(self, path, data):
+        self.buffer_init = init_object
+        
+        # Measured here, before saving starts, since it takes too long for the acquisition loop
+        self.reset_codec()
+        if self.mode == self._modes.RAW and self.codec == 'auto':
+            self._selected_codec = self.select_codec(init_object)
+    
+    def callback_uses_metadata(self):
+        # NPY, TXT and IMAGE files hold the frames only
+        return self.mode in (self._modes.HDF5, self._modes.RAW, self._modes.TIFF)
+    
+    def prepare_metadata(self):
+        # The AOI can not change while saving, since the buffer holds frames of a fixed shape
+        control = self.camera_control_be
+        self._aoi_limits = [int(value) for value in control.camera.aoi.limits.magnitude]
+        
+        # The device timestamp is read by the camera control once per frame, only when some metadata is stored
+        self._device_timestamps = control.device_timestamps
+        if self.needs_metadata():
+            control.device_timestamps = True
+    
+    def release_metadata(self):
+        self.camera_control_be.device_timestamps = self._device_timestamps
+    
+    def get_frame_metadata(self, frame):
+        # Only cached or local values, to keep camera calls out of the acquisition loop
+        control = self.camera_control_be
+        camera = control.camera
+        
+        return (self.trigger_count,
+                self.get_device_timestamp(),
+                time(),
+                control._exposure,
+                control._frame_rate,
+                self._aoi_limits,
+                bool(getattr(camera, '_dark_correction', False)),
+                bool(getattr(camera, '_gain_correction', False)),
+                control.averages)
+    
+    def set_capture(self, pre_trigger, post_trigger=0):
+        # Durations are converted to frames at the current frame rate
+        frame_rate = self.camera_control_be._frame_rate / self.save_every * ureg.Hz
+        if isinstance(pre_trigger, ureg.Quantity):
+            pre_trigger = int(round((pre_trigger * frame_rate).to('').magnitude))
+        if isinstance(post_trigger, ureg.Quantity):
+            post_trigger = int(round((post_trigger * frame_rate).to('').magnitude))
+        
+        super().set_capture(pre_trigger, post_trigger)
+    
+    def get_device_timestamp(self):
+        # Read by the camera control for the current frame, None when not available
+        device_time = self.camera_control_be._last_device_time
+        
+        return np.nan if device_time is None else device_time
+    
+    def _as_batch(self, data, metadata):
+        # A packet of a single frame is read from the buffer as the frame itself
+        if data.ndim == len(self.buffer.inner_size):
+            data = data[np.newaxis]
+        
+        return data, np.reshape(metadata, -1)
+    
+    def expected_frames(self):
+        if self._stop_condition == StopConditions.COUNT:
+            return self.limit
+        else:
+            frame_rate = self.camera_control_be.get_frame_rate().to('Hz').magnitude
+            return int(self.limit.to('s').magnitude * frame_rate / self.save_every) + 1
+    
+    def close_writer(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.log_info("Saved {} frames to {}".format(self.writer.count, self.writer.path))
+            self.writer = None
+    
+    def check_segment(self, path):
+        # With file rotation, a new segment path means the current file is complete
+        if self.segmented and self.writer is not None and self.writer.path != str(path):
+            self.close_writer()
+    
+    def save_hdf5(self, path, data, metadata=None):
+        self.check_segment(path)
+        
+        if self.writer is None:
+            attributes = {'frame_rate': self.camera_control_be.get_frame_rate().to('Hz').magnitude,
+                          'bit_depth': self.camera_control_be.get_bit_depth()}
+            self.writer = HDF5FrameWriter(path,
+                                          compression=self.compression,
+                                          compression_opts=self.compression_opts,
+                                          chunk_frames=self.chunk_frames,
+                                          attributes=attributes)
+        
+        self.writer.write(*self._as_batch(data, metadata))
+    
+    def stateful_callback(self):
+        # These modes append every packet to the writer of the current file (or segment)
+        return self.mode in (self._modes.HDF5, self._modes.TIFF, self._modes.RAW)
+    
+    def reset_codec(self):
+        self._selected_codec = None
+    
+    def select_codec(self, frame):
+        """
+        Mide los códecs sobre un cuadro sintético con la forma y el tipo de `frame` y devuelve el de mayor compresión
+        que sigue la tasa de datos de la cámara (ver `uc480.utilities.compression.select_codec`). Los códecs lentos sólo
+        se miden si la tasa de datos es baja.
+        """
+        frame = np.asarray(frame)
+        frame_rate = self.camera_control_be.get_frame_rate().to('Hz').magnitude
+        data_rate = frame_rate * frame.nbytes / self.save_every / 1e6
+        
+        bit_depth = 8 if frame.dtype.itemsize == 1 else 10
+        frames = synthetic_frames(count=1, shape=frame.shape, bit_depth=bit_depth)
+        codec = select_codec(data_rate, benchmark(frames=frames, codecs=candidate_codecs(data_rate)))
+        self.log_info("Selected codec '{}' for {:.1f} MB/s".format(codec, data_rate))
+        
+        return codec
+    
+    def save_raw(self, path, data, metadata=None):
+        data, metadata = self._as_batch(data, metadata)
+        self.check_segment(path)
+        
+        if self.writer is None:
+            codec = self.codec
+            if codec == 'auto':
+                # Normally measured by initialize_buffer; kept for every segment of the recording
+                if self._selected_codec is None:
+                    self._selected_codec = self.select_codec(data[0])
+                codec = self._selected_codec
+            self.writer = RawFrameWriter(path, codec=codec)
+        
+        self.writer.write(data, metadata)
+
+    def degrade(self):
+        # Compression is the only part of saving that can be dropped without losing frames
+        if isinstance(self.writer, RawFrameWriter) and self.writer.compress and self.writer.codec.name != 'none':
+            self.writer.compress = False
+            self.log_info("Saving cannot keep up: storing frames without '{}' compression".format(self.writer.codec.label))
+            return True
+
+        return False
+
+    def save_txt(self, path, data, metadata=None):
         if np.issubdtype(data.dtype, np.integer):
             fmt = self._formats.INTEGER.value
         elif np.issubdtype(data.dtype, np.floating):
             fmt = self._formats.FLOAT.value
 
-        np.savetxt(path, data, fmt=fmt, delimiter=self.DELIMITER)
+        write_text(path, data, fmt=fmt, delimiter=self.DELIMITER)
     
-    def save_npy(self, path, data):
+    def save_npy(self, path, data, metadata=None):
         np.save(path, data)
         
-    def save_image(self, path, data):
+    def save_image(self, path, data, metadata=None):
         imwrite(path, data)
     
-    def save_tiff(self, path, data):
-        raise NotImplementedError("Cannot save in TIFF format.")
+    def save_tiff(self, path, data, metadata=None):
+        data, metadata = self._as_batch(data, metadata)
+        self.check_segment(path)
+        
+        if self.writer is None:
+            expected_bytes = self.expected_frames() * data[0].nbytes
+            if self.rotate_bytes is not None:
+                expected_bytes = min(expected_bytes, self.rotate_bytes)
+            self.writer = TiffFrameWriter(path, expected_bytes=expected_bytes)
+        
+        self.writer.write(data, metadata)
 
 
 class CameraSaveUi(Frontend):
@@ -892,6 +1187,9 @@ class ImageViewerUi(Frontend):
     def setupUi(self):
         super().setupUi()
         
+        # Imported here so that headless runs (see headless.py) never load pyqtgraph
+        from pyqtgraph import ImageView
+        
         self.widget = ImageView(parent=self)
         self.setCentralWidget(self.widget)
         
@@ -1457,8 +1457,25 @@ class Camera(Driver):
             data = self.correct_dark(data)
         
         return data
-    
-    
+
+    @Action()
+    def get_device_timestamp(self):
+        """
+        Timestamp of the last captured image, in seconds, taken by the camera at the start of the exposure (device
+        clock, 0.1 us resolution, reset when the camera is powered up).
+        """
+        info = ueye.UEYEIMAGEINFO()
+
+        safe_call(self,
+                  ueye.is_GetImageInfo,
+                  self._handle,
+                  self._mem_id,
+                  info,
+                  ueye.sizeof(info))
+
+        return info.u64TimestampDevice.value * 1e-7
+
+
     # Miscellaneous
     @Action()
     def reset_to_default(self):
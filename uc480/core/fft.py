@@ -6,14 +6,13 @@ Created on Thu Mar 28 13:01:25 2019
 """
 
 from uc480.utilities import FFT
+from uc480.utilities.metrics import PipelineMonitor
 
 from lantz.qt.app import Backend, Frontend, QtCore
 from lantz.core import ureg
 
 import numpy as np
 
-from pyqtgraph import PlotWidget
-
 from time import monotonic
 
 
@@ -29,6 +28,12 @@ class FFTAnalyzer(Backend):
         
         self.fft = FFT()
         self.spectra_analyzer_be = spectra_analyzer_backend
+        
+        if spectra_analyzer_backend is None:
+            self.monitor = PipelineMonitor()
+        else:
+            self.monitor = spectra_analyzer_backend.monitor
+        self.metrics = self.monitor.stage('fft')
     
     def set_enable(self, value):
         self.enable = value
@@ -39,13 +44,15 @@ class FFTAnalyzer(Backend):
     
     def update_from_spectrum(self, spectrum):
         if self.enable:
-            now = monotonic() * ureg.ms
+            start = self.metrics.begin()
+            now = monotonic() * ureg.s
             
             if not self.initialized:
                 self.fft.update_x(spectrum.x)
                 self.initialized = True
             
             self.fft.update_from_spectrum(spectrum)
+            self.metrics.end(start)
             self.new_data.emit(self.fft, now)
     
     # Send/read signals' functions:
@@ -106,6 +113,9 @@ class FFTViewerUi(Frontend):
     def setupUi(self):
         super().setupUi()
         
+        # Lazy import, see ImageViewerUi.setupUi
+        from pyqtgraph import PlotWidget
+        
         self.widget = PlotWidget(parent=self)
         self.setCentralWidget(self.widget)
         
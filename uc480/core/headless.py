@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 09:12:40 2026
+
+@author: Axel Lacapmesure
+"""
+
+from .camera import CameraControl, CameraSave
+from .spectra import SpectraAnalyzer, SpectraSave
+from .fft import FFTAnalyzer
+from uc480.config import JOB_DEFAULT
+from uc480.utilities.save import StopConditions
+from uc480.utilities.stream import StreamServer
+
+from lantz.qt.app import Backend
+from lantz.core import ureg
+
+from enum import Enum
+
+from time import monotonic, sleep
+
+from yaml import safe_load, YAMLError
+
+
+def load_job(job_path=None):
+    if job_path is None:
+        job_path = JOB_DEFAULT
+
+    with open(job_path, 'r') as file:
+        try:
+            job = safe_load(file)
+        except YAMLError as exc:
+            raise ValueError("Invalid job file '{}': {}".format(job_path, exc))
+
+    return job if job else {}
+
+
+def to_quantity(value, units):
+    """
+    Convierte un valor del archivo de trabajo en una cantidad de pint. Acepta strings con unidades (por ejemplo,
+    '20 Hz') o números, en cuyo caso se interpretan en las unidades `units`.
+    """
+    if value is None:
+        return None
+    elif isinstance(value, str):
+        return ureg.Quantity(value).to(units)
+    else:
+        return float(value) * ureg(units)
+
+
+class HeadlessRunner(Backend):
+    """
+    Ejecuta una adquisición sin interfaz gráfica a partir de un archivo de trabajo YAML.
+
+    Reutiliza los mismos backends que la aplicación gráfica (`CameraControl`, `SpectraAnalyzer`, `FFTAnalyzer`,
+    `CameraSave` y `SpectraSave`), pero reemplaza el `QTimer` de `CameraControl` por un lazo de adquisición propio.
+    Las señales de Qt entre backends se entregan por conexión directa en el mismo hilo, de modo que no se necesita un
+    QApplication ni un event loop, y nunca se importa pyqtgraph.
+
+    Parameters
+    ----------
+    camera
+        Instancia de la cámara (envuelta con `wrap_driver_cls`).
+    job : dict
+        Contenido del archivo de trabajo. Ver `uc480/config/job_default.yaml` para la estructura y los valores por
+        defecto de cada sección (camera, processing, save, stop).
+    """
+
+    class _stops(Enum):
+        COUNT = 'count'
+        TIME = 'time'
+        SAVED = 'saved'
+
+    def __init__(self, camera, job, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.job = job
+        self.count = 0
+        self.start_time = None
+        self.running = False
+
+        self.control_be = CameraControl(camera=camera)
+        self.spectra_be = None
+        self.fft_be = None
+        self.camera_save_be = None
+        self.save_be = None
+        self.stream_server = None
+
+        self.setup_camera(job.get('camera') or {})
+        self.setup_processing(job.get('processing') or {})
+        self.setup_save(job.get('save') or {})
+        self.setup_stream(job.get('stream') or {})
+        self.setup_stop(job.get('stop') or {})
+
+    @property
+    def camera(self):
+        return self.control_be.camera
+
+    @property
+    def save_managers(self):
+        return [manager for manager in [self.camera_save_be, self.save_be] if manager is not None]
+
+    def setup_camera(self, config):
+        config_path = config.get('config', 'default')
+        if config_path and config_path != 'default':
+            self.camera.setup_from_file(config_path=config_path)
+
+        if config.get('bit_depth') is not None:
+            self.control_be.set_bit_depth(int(config['bit_depth']))
+        if config.get('pixel_clock') is not None:
+            self.control_be.set_pixel_clock(to_quantity(config['pixel_clock'], 'MHz'))
+        if config.get('frame_rate') is not None:
+            self.control_be.set_frame_rate(to_quantity(config['frame_rate'], 'Hz'))
+        if config.get('exposure') is not None:
+            self.control_be.set_exposure(to_quantity(config['exposure'], 'ms'))
+        if config.get('aoi') is not None:
+            self.control_be.set_aoi(config['aoi'])
+        if config.get('dark_correction') is not None:
+            self.control_be.set_dark_correction(bool(config['dark_correction']))
+
+        self.control_be.averages = config.get('averages', 1)
+        self.control_be.device_timestamps = bool(config.get('device_timestamps', False))
+
+        if config.get('shared_memory'):
+            self.control_be.enable_shared_memory(name=config['shared_memory'],
+                                                 slots=config.get('shared_memory_slots', 8))
+
+        self.log_info("Camera configured: {:~} frame rate, {:~} exposure".format(self.camera.frame_rate,
+                                                                                 self.camera.exposure))
+
+    def setup_processing(self, config):
+        spectra = config.get('spectra') or {}
+        fft = config.get('fft') or {}
+
+        if spectra.get('enable', False) or fft.get('enable', False):
+            self.spectra_be = SpectraAnalyzer(camera_control_backend=self.control_be)
+            self.spectra_be.link_camera()
+
+            self.spectra_be.set_mode(spectra.get('mode', 'intensity'))
+            self.spectra_be.set_axis(spectra.get('axis', 'horizontal'))
+            self.spectra_be.set_averages(spectra.get('averages', 1))
+            self.spectra_be.set_normalize(spectra.get('normalize', False))
+            self.spectra_be.set_subtract_dark(spectra.get('subtract_dark', False))
+            if spectra.get('aoi') is not None:
+                self.spectra_be.set_aoi(spectra['aoi'])
+            if spectra.get('x_calibration') is not None:
+                self.spectra_be.set_x_calibration(spectra['x_calibration'])
+            self.spectra_be.set_enable(True)
+
+        if fft.get('enable', False):
+            self.fft_be = FFTAnalyzer(spectra_analyzer_backend=self.spectra_be)
+            self.fft_be.link_spectra_analyzer()
+            self.fft_be.read_interpolation(fft.get('interpolation', 'cubic'))
+            self.fft_be.set_enable(True)
+
+    def setup_save(self, config):
+        frames = config.get('frames') or {}
+        spectra = config.get('spectra') or {}
+
+        if frames.get('enable', False):
+            self.camera_save_be = CameraSave(camera_control_be=self.control_be,
+                                             mode=frames.get('mode', 'numpy binary'))
+            self.configure_save_manager(self.camera_save_be, frames)
+            for key in ['compression', 'compression_opts', 'chunk_frames', 'codec']:
+                if key in frames:
+                    setattr(self.camera_save_be, key, frames[key])
+            # After configure_save_manager, since setting packet_length resets the buffer
+            self.camera_save_be.initialize_buffer()
+            # After initialize_buffer, since file storage needs the numeric frame records
+            if frames.get('buffer_storage'):
+                self.camera_save_be.buffer.storage = str(frames['buffer_storage'])
+            self.setup_capture(self.camera_save_be, frames.get('capture') or {})
+
+        if spectra.get('enable', False):
+            if self.spectra_be is None:
+                raise ValueError("Spectra cannot be saved: spectra processing is not enabled in the job file.")
+
+            self.save_be = SpectraSave(spectra_analyzer_be=self.spectra_be)
+            self.configure_save_manager(self.save_be, spectra)
+            for key in ['processed', 'raw', 'dark', 'reference']:
+                if key in spectra:
+                    self.save_be.callback_kwargs[key] = bool(spectra[key])
+            self.setup_capture(self.save_be, spectra.get('capture') or {})
+
+    def configure_save_manager(self, manager, config):
+        if not config.get('path'):
+            raise ValueError("A save path is required in headless mode (no file dialogs are available).")
+
+        # Save targets inherit the job stop condition unless they define their own
+        stop = dict(self.job.get('stop') or {})
+        stop.update({key: config[key] for key in ['condition', 'limit'] if key in config})
+        condition = stop.get('condition', 'count')
+        if condition == self._stops.SAVED.value:
+            condition = 'count'
+
+        manager.stop_condition = condition
+        if manager.stop_condition == StopConditions.COUNT:
+            manager.limit = int(stop.get('limit', 1))
+            packet_length = manager.limit
+        else:
+            manager.limit = to_quantity(stop.get('limit', 1), 's')
+            packet_length = int(2 * (manager.limit * self.camera.frame_rate).to('').magnitude)
+
+        manager.callback_mode = config.get('callback_mode', 'serial')
+        manager.queue_length = int(config.get('queue_length', manager.BUFFER_OVERHEAD_IN_PACKETS))
+        manager.workers = int(config.get('workers', 1))
+        manager.backpressure_policy = config.get('backpressure', 'warn')
+        manager.backpressure_threshold = float(config.get('backpressure_threshold', manager.backpressure_threshold))
+        manager.backpressure_horizon = float(config.get('backpressure_horizon', manager.backpressure_horizon))
+        manager.packet_length = int(config.get('packet_length', max(packet_length, 1)))
+        manager.append = config.get('append', 'timestamp')
+        manager.save_every = config.get('save_every', 1)
+        if 'metadata_table' in config:
+            manager.metadata_table = bool(config['metadata_table'])
+        if 'records' in config:
+            manager.records = bool(config['records'])
+        if config.get('rotate_size') is not None:
+            manager.rotate_bytes = int(to_quantity(config['rotate_size'], 'MB').to('B').magnitude)
+        if config.get('rotate_time') is not None:
+            manager.rotate_time = to_quantity(config['rotate_time'], 's').magnitude
+        manager.path = str(config['path'])
+
+    def setup_capture(self, manager, config):
+        if not config.get('enable', False):
+            return None
+
+        # Durations (as '2 s') are only understood by CameraSave, which knows the frame rate
+        pre_trigger = config.get('pre_trigger', 0)
+        post_trigger = config.get('post_trigger', 0)
+        manager.set_capture(to_quantity(pre_trigger, 's') if isinstance(pre_trigger, str) else pre_trigger,
+                            to_quantity(post_trigger, 's') if isinstance(post_trigger, str) else post_trigger)
+
+        threshold = float(config['threshold'])
+        if config.get('source', 'frames') == 'spectra':
+            if self.spectra_be is None:
+                raise ValueError("Spectra events require spectra processing to be enabled in the job file.")
+            manager.connect_event(self.spectra_be.new_data, lambda spectrum, *args: spectrum.y.max() > threshold)
+        else:
+            manager.connect_event(self.control_be.new_data, lambda frame: frame.max() > threshold)
+
+    def setup_stream(self, config):
+        if not config.get('enable', False):
+            return None
+
+        self.stream_server = StreamServer(config.get('address', '127.0.0.1:5555'))
+        if config.get('frames', True):
+            self.stream_server.connect_frames(self.control_be.new_data)
+        if config.get('spectra', True) and self.spectra_be is not None:
+            self.stream_server.connect_spectra(self.spectra_be.new_data)
+
+    def setup_stop(self, config):
+        default = self._stops.SAVED if self.save_managers else self._stops.COUNT
+        self.stop_condition = self._stops(config.get('condition', default.value))
+
+        if self.stop_condition == self._stops.COUNT:
+            self.limit = int(config.get('limit', 1))
+        elif self.stop_condition == self._stops.TIME:
+            self.limit = to_quantity(config.get('limit', 1), 's')
+        elif self.stop_condition == self._stops.SAVED and not self.save_managers:
+            raise ValueError("Stop condition 'saved' requires at least one enabled save target.")
+
+    @property
+    def run_time(self):
+        if self.start_time is None:
+            return 0 * ureg.s
+        return (monotonic() - self.start_time) * ureg.s
+
+    @property
+    def stop_flag(self):
+        if self.stop_condition == self._stops.COUNT:
+            return self.count >= self.limit
+        elif self.stop_condition == self._stops.TIME:
+            return self.run_time >= self.limit
+        elif self.stop_condition == self._stops.SAVED:
+            return not any(manager.enabled for manager in self.save_managers)
+
+    def start(self):
+        self.count = 0
+
+        for manager in self.save_managers:
+            manager.start()
+
+        if self.stream_server is not None:
+            self.stream_server.start()
+            self.log_info("Streaming on {}".format(self.stream_server.address))
+
+        self.camera.start_video_capture()
+        self.start_time = monotonic()
+        self.running = True
+        self.log_info("Headless acquisition started")
+
+    def stop(self):
+        self.running = False
+        self.camera.stop_video_capture()
+
+        for manager in self.save_managers:
+            if manager.enabled:
+                manager.stop()
+
+        if self.spectra_be is not None:
+            self.spectra_be.set_enable(False)
+        if self.fft_be is not None:
+            self.fft_be.set_enable(False)
+
+        self.control_be.disable_shared_memory()
+        if self.stream_server is not None:
+            self.stream_server.stop()
+
+        self.log_info("Headless acquisition stopped after {} frames ({:.1f~})".format(self.count, self.run_time))
+
+    def run(self):
+        self.start()
+        next_time = monotonic()
+
+        try:
+            while not self.stop_flag:
+                self.control_be.acquire()
+                self.count += 1
+
+                # Pace the loop as CameraControl.timer would, without drifting
+                interval = (1 / self.camera.frame_rate).to('s').magnitude
+                next_time = max(next_time + interval, monotonic())
+                sleep(max(next_time - monotonic(), 0))
+        except KeyboardInterrupt:
+            self.log_info("Headless acquisition interrupted by user")
+        finally:
+            self.stop()
+
+
+def run_job(job_path=None):
+    from lantz.qt import wrap_driver_cls
+    from .driver import Camera
+
+    job = load_job(job_path)
+    QCamera = wrap_driver_cls(Camera)
+
+    with QCamera() as camera:
+        runner = HeadlessRunner(camera, job)
+        runner.run()
+
+    return runner
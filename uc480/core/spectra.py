@@ -7,6 +7,7 @@ Created on Thu Mar 28 13:01:25 2019
 
 from uc480.utilities.save import SaveManager, PATH, DATA
 from uc480.utilities import AOI2D, Spectrum, file_dialog_save
+from uc480.utilities.metrics import PipelineMonitor
 
 from lantz.core import ureg
 from lantz.qt.app import Backend, Frontend, QtCore
@@ -17,8 +18,6 @@ from re import split
 
 from time import monotonic
 
-from pyqtgraph import PlotWidget
-
 
 class SpectraAnalyzer(Backend):
     # XCAL_POL = [-2.07418056e-06, -6.01516616e-02, 8.39719080e+02]
@@ -54,6 +53,12 @@ class SpectraAnalyzer(Backend):
 
         self.camera_control_be = camera_control_backend
 
+        if camera_control_backend is None:
+            self.monitor = PipelineMonitor()
+        else:
+            self.monitor = camera_control_backend.monitor
+        self.metrics = self.monitor.stage('spectra')
+
         if test:
             self.set_aoi_from_camera(False)
             self.aoi.set_canvas([0, 1280, 0, 1024])
@@ -212,12 +217,14 @@ class SpectraAnalyzer(Backend):
 
     def from_image(self, image, timestamp=None):
         if self.enable:
-            now = monotonic() * ureg.ms
+            start = self.metrics.begin()
+            now = monotonic() * ureg.s
 
             mean_axis = 0 if self.wavelength_axis == 'horizontal' else 1
             y = np.mean(image, axis=mean_axis)
 
             self.spectrum.y = y
+            self.metrics.end(start)
             self.new_data.emit(self.spectrum.processed, now)
 
     def generate_test_image(self):
@@ -447,6 +454,9 @@ class SpectraViewerUi(Frontend):
     def setupUi(self):
         super().setupUi()
 
+        # Lazy import, see ImageViewerUi.setupUi
+        from pyqtgraph import PlotWidget
+
         self.widget = PlotWidget(parent=self)
         self.setCentralWidget(self.widget)
 
@@ -494,6 +504,9 @@ class SpectraSave(SaveManager, Backend):
                          dark=False,
                          reference=False)
 
+        if spectra_analyzer_be is not None:
+            self.set_monitor(spectra_analyzer_be.monitor, 'spectra_save')
+
     @staticmethod
     def save_spectrum(path: str, spectrum: Spectrum, *args, **kwargs):
         spectrum.save(path=path, *args, **kwargs)
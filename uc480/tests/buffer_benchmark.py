@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:12:37 2026
+
+@author: Axel Lacapmesure
+
+Microbenchmarks of the ring buffers: FIFOBuffer write/read at several frame shapes and packet sizes, BufferCore index
+cycling and index generation, and _RawSpectrum slicing, next to a raw np.copyto baseline. Run it before and after
+changing the buffers and compare the JSON files.
+Usage: python buffer_benchmark.py [results.json] [repeat]
+"""
+
+import sys
+import json
+import platform
+
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+from uc480.utilities.buffer import FIFOBuffer, BufferCore
+from uc480.utilities.spectrum import Spectrum
+
+FRAME_SHAPES = [(1280,), (256, 320), (1024, 1280)]
+PACKET_LENGTHS = [1, 16, 64]
+INDEX_LENGTHS = [16, 256, 4096]
+
+
+def measure(func, number, repeat):
+    """Mejor y mediana, entre `repeat` repeticiones, del tiempo por llamada de `func` llamada `number` veces."""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            func()
+        times.append((perf_counter() - start) / number)
+
+    return min(times), float(np.median(times))
+
+
+def result(name, params, times, nbytes=0):
+    best, median = times
+    entry = {'name': name, 'params': params, 'best_s': best, 'median_s': median}
+    if nbytes:
+        entry['MBps'] = nbytes / best / 1e6
+
+    return entry
+
+
+def bench_copyto(shape, packet_length, repeat):
+    source = np.ones((packet_length, ) + shape, dtype=np.uint16)
+    target = np.zeros((2 * packet_length, ) + shape, dtype=np.uint16)
+
+    times = measure(lambda: np.copyto(target[0:packet_length], source), 20, repeat)
+
+    return result('np.copyto', {'shape': shape, 'packet_length': packet_length}, times, source.nbytes)
+
+
+def bench_fifo(shape, packet_length, repeat):
+    frame = np.ones(shape, dtype=np.uint16)
+    block = np.ones((packet_length, ) + shape, dtype=np.uint16)
+    buffer = FIFOBuffer(length=2 * packet_length, packet_length=packet_length, init_object=frame)
+    params = {'shape': shape, 'packet_length': packet_length}
+
+    def write_read():
+        for _ in range(packet_length):
+            buffer.write(frame)
+        buffer.read(packet_length)
+
+    def write_read_many():
+        buffer.write_many(block)
+        buffer.read_many(packet_length)
+
+    def write_read_view():
+        buffer.write_many(block)
+        buffer.read_view(packet_length)
+
+    return [result('FIFOBuffer.write+read', params, measure(write_read, 20, repeat), block.nbytes),
+            result('FIFOBuffer.write_many+read_many', params, measure(write_read_many, 20, repeat), block.nbytes),
+            result('FIFOBuffer.write_many+read_view', params, measure(write_read_view, 20, repeat), block.nbytes)]
+
+
+def bench_fifo_latency(shape, repeat):
+    frame = np.ones(shape, dtype=np.uint16)
+    buffer = FIFOBuffer(length=64, init_object=frame)
+
+    def write_read():
+        buffer.write(frame)
+        buffer.read()
+
+    return result('FIFOBuffer.write+read (1 element)', {'shape': shape}, measure(write_read, 200, repeat), frame.nbytes)
+
+
+def bench_buffer_core(length, repeat):
+    buffer = BufferCore(length=length)
+    params = {'length': length}
+
+    return [result('BufferCore.__call__', params, measure(buffer, 1000, repeat)),
+            result('BufferCore.indices_new_first', params, measure(lambda: buffer.indices_new_first, 200, repeat)),
+            result('BufferCore.indices_old_first', params, measure(lambda: buffer.indices_old_first, 200, repeat))]
+
+
+def bench_raw_spectrum(length, repeat):
+    x = np.arange(1280, dtype=float)
+    spectrum = Spectrum._RawSpectrum(x=x, y=np.ones((length, x.size)), buffer_size=length)
+    params = {'length': length, 'pixels': x.size}
+
+    return [result('_RawSpectrum[0]', params, measure(lambda: spectrum[0], 100, repeat)),
+            result('_RawSpectrum[0:length//2]', params, measure(lambda: spectrum[0:length // 2], 20, repeat))]
+
+
+def run(repeat=5):
+    results = []
+    for shape in FRAME_SHAPES:
+        results.append(bench_fifo_latency(shape, repeat))
+        for packet_length in PACKET_LENGTHS:
+            results.append(bench_copyto(shape, packet_length, repeat))
+            results.extend(bench_fifo(shape, packet_length, repeat))
+
+    for length in INDEX_LENGTHS:
+        results.extend(bench_buffer_core(length, repeat))
+        results.extend(bench_raw_spectrum(length, repeat))
+
+    return {'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'results': results}
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    report = run(repeat)
+
+    print("{:<36}{:<34}{:>14}{:>12}".format("Benchmark", "Parameters", "Best [us]", "MB/s"))
+    for entry in report['results']:
+        params = ", ".join("{}={}".format(key, value) for key, value in entry['params'].items())
+        throughput = "{:>12.1f}".format(entry['MBps']) if 'MBps' in entry else ""
+        print("{:<36}{:<34}{:>14.2f}{}".format(entry['name'], params, entry['best_s'] * 1e6, throughput))
+
+    if path is not None:
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        print("\nResults written to {}".format(path))
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:05:49 2026
+
+@author: Axel Lacapmesure
+
+Throughput and compression ratio of the available codecs on synthetic frames.
+Usage: python codec_benchmark.py [frame_rate_Hz] [bit_depth]
+"""
+
+import sys
+
+from uc480.utilities.compression import benchmark, select_codec, synthetic_frames
+
+frame_rate = float(sys.argv[1]) if len(sys.argv) > 1 else 20.
+bit_depth = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+frames = synthetic_frames(count=8, bit_depth=bit_depth)
+results = benchmark(frames, repeat=2)
+
+print("{:<16}{:>14}{:>14}{:>10}".format("Codec", "Encode MB/s", "Decode MB/s", "Ratio"))
+for result in results:
+    print("{codec:<16}{encode_MBps:>14.1f}{decode_MBps:>14.1f}{ratio:>10.2f}".format(**result))
+
+data_rate = frame_rate * frames[0].nbytes / 1e6
+print("\nData rate at {} Hz: {:.1f} MB/s".format(frame_rate, data_rate))
+print("Default codec: {}".format(select_codec(data_rate, results)))
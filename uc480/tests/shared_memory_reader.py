@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 12:58:03 2026
+
+@author: Axel Lacapmesure
+
+Run in a separate process while CameraControl publishes frames with
+enable_shared_memory('uc480_frames').
+Only needs numpy: importing uc480.utilities.shm does not load the camera
+driver or Qt.
+"""
+
+from uc480.utilities.shm import SharedFrameReader
+
+with SharedFrameReader('uc480_frames') as reader:
+    for idx in range(100):
+        frame, info = reader.wait_next(timeout=5)
+        
+        if frame is None:
+            print("No frames published in the last 5 s")
+            break
+        
+        mean = frame.mean()
+        
+        if reader.is_valid(info):
+            print("Frame {}: shape {}, exposure {} ms, mean {:.2f}".format(info.sequence, info.shape, info.exposure, mean))
+        
+        del frame
+    
+    print("Missed frames: {}".format(reader.missed))
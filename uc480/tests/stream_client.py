@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:31:12 2026
+
+@author: Axel Lacapmesure
+
+Monitoring client for StreamServer (run while a server is publishing).
+Only needs numpy: importing uc480.utilities.stream does not load uc480.core.
+"""
+
+from uc480.utilities.stream import StreamClient, Channels, DropPolicies
+
+last_sequence = {}
+
+with StreamClient('127.0.0.1:5555', policy=DropPolicies.CONFLATE) as client:
+    for idx in range(100):
+        channel, sequence, timestamp, array = client.receive()
+        
+        skipped = sequence - last_sequence.get(channel, sequence - 1) - 1
+        last_sequence[channel] = sequence
+        
+        print("{}: message {} ({} skipped), shape {}, dtype {}".format(Channels(channel).name, sequence, skipped, array.shape, array.dtype))
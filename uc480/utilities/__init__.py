@@ -1,10 +1,30 @@
 # -*- coding: utf-8 -*-
 
-from . import aoi, buffer, enums, fft, func, save, spectrum
-
-from .aoi import AOI2D
-from .buffer import BufferCore
-from .fft import FFT
-from .func import get_layout0, prop_to_int, file_dialog_save, file_dialog_open, safe_call, safe_set, safe_get
-from .save import SaveManager
-from .spectrum import Spectrum
\ No newline at end of file
+from importlib import import_module
+
+# Modules and names are imported on first access (see uc480/__init__.py)
+_MODULES = ('aoi', 'buffer', 'compression', 'enums', 'fft', 'func', 'metrics', 'save', 'shm', 'spectrum', 'stats',
+            'stream', 'writers')
+
+_NAMES = {'AOI2D': 'aoi',
+          'BufferCore': 'buffer',
+          'FFT': 'fft',
+          'get_layout0': 'func',
+          'prop_to_int': 'func',
+          'file_dialog_save': 'func',
+          'file_dialog_open': 'func',
+          'safe_call': 'func',
+          'safe_set': 'func',
+          'safe_get': 'func',
+          'PipelineMonitor': 'metrics',
+          'SaveManager': 'save',
+          'Spectrum': 'spectrum'}
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return import_module('.' + name, __name__)
+    if name in _NAMES:
+        return getattr(import_module('.' + _NAMES[name], __name__), name)
+
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
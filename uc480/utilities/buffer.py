@@ -5,7 +5,7 @@ Created on Mon Feb 25 12:57:34 2019
 @author: Fotonica
 """
 
-from numpy import arange, zeros, full, ndarray, broadcast_to, isscalar, ceil
+from numpy import arange, zeros, empty, array, ndarray, memmap, concatenate, isscalar, ceil, dtype as np_dtype
 
 from enum import IntEnum, auto
 
@@ -15,6 +15,10 @@ from warnings import warn
 
 from types import FunctionType, BuiltinFunctionType
 
+from threading import Event
+
+from time import perf_counter
+
 class BufferOverrun(Exception):
     """
         Excepción cuando ocurre un overrun del buffer.
@@ -28,6 +32,34 @@ class BufferEnd(Exception):
     pass
 
 
+def record_dtype(init_object, fields, name='data'):
+    """
+    Tipo estructurado para un FIFOBuffer de registros: un campo `name` con los
+    datos de una muestra (con el tipo y la forma de init_object, que puede ser
+    un tipo, un escalar o un ndarray de ejemplo), seguido de los campos del
+    tipo estructurado `fields`.
+    
+    Ejemplo
+    -------
+    >>> dtype = record_dtype(zeros((1024, 1280), dtype='u2'),
+    ...                      [('sequence', '<u8'), ('timestamp', '<f8')])
+    >>> buffer = FIFOBuffer(length=100, init_object=dtype)
+    >>> buffer.write((frame, 0, time()))
+    """
+    fields = np_dtype(fields)
+    if name in (fields.names or ()):
+        raise ValueError("Field name '{}' is reserved for the sample data.".format(name))
+    
+    if isinstance(init_object, ndarray):
+        payload = (name, init_object.dtype, init_object.shape)
+    elif isscalar(init_object):
+        payload = (name, array(init_object).dtype)
+    else:
+        payload = (name, np_dtype(init_object))
+    
+    return np_dtype([payload] + [(field, fields.fields[field][0]) for field in fields.names])
+
+
 class FIFOBuffer(QtCore.QObject):
     """
     Clase para buffer circular tipo "first-intput, first-output" (FIFO).
@@ -50,7 +82,8 @@ class FIFOBuffer(QtCore.QObject):
     init_object
         Clase o instancia del objeto que se utilizará para construir el buffer.
         El buffer consistirá en un ndarray de numpy (cuyo largo está
-        determinado por length) que contenga copias del init_object. Por
+        determinado por length) que contenga copias del init_object. Acepta
+        también un numpy.dtype, incluso estructurado (ver 'record_dtype'). Por
         defecto, float.
     overrun_policy : {'error', 'skip', 'silent_skip', 'none'} or callable
         Define cómo tratar los eventos de buffer overrun. Acepta un string
@@ -71,6 +104,27 @@ class FIFOBuffer(QtCore.QObject):
         Define cómo tratar los eventos donde el buffer se llena. Acepta los
         mismos valores que overrun_policy. En el caso de configuración 'error',
         levanta la excepción BufferEnd. Por defecto, igual a 'silent_skip'.
+    mirrored : bool
+        Si es True, los datos se guardan duplicados en un array de largo
+        2*length, de modo que cualquier lectura de hasta length elementos es
+        una única vista contigua (ver 'read_view'). Duplica la memoria y el
+        costo de escritura. Por defecto, igual a False.
+    storage : str
+        Ruta de un archivo donde guardar los datos del buffer mediante un
+        np.memmap, en lugar de reservarlos en RAM. Permite buffers de cientos
+        de miles de cuadros: el sistema operativo mantiene en memoria las
+        páginas en uso y escribe el resto a disco. El archivo se crea (o se
+        sobrescribe) con el tamaño total del buffer cada vez que el buffer se
+        reinicializa. No admite buffers de objetos de Python. Por defecto,
+        None (en RAM).
+    mode : {'fifo', 'latest'}
+        Modo de lectura. En modo 'fifo' se leen todos los elementos en orden de
+        escritura. En modo 'latest' (para vistas en vivo y monitores, a los que
+        sólo les interesan los datos más recientes) el escritor nunca produce
+        un overrun: sobrescribe los elementos no leídos, y cada lectura de
+        'step' elementos devuelve, en orden de escritura, los más nuevos no
+        leídos (a lo sumo 'step'), descartando los anteriores. Por defecto,
+        igual a 'fifo'.
     
     Raises
     ------
@@ -95,7 +149,11 @@ class FIFOBuffer(QtCore.QObject):
     filled()
         Cada vez que el índice de escritura llega al final del buffer.
     packet_filled()
-        Cada vez que hay un paquete nuevo para leer.
+        Cada vez que hay un paquete nuevo para leer. Si una escritura completa
+        varios paquetes, se emite una única vez.
+    packets_filled(int)
+        Junto con packet_filled, con la cantidad de paquetes completados por
+        la escritura.
     ended()
         Cuando se intenta leer pero no hay nuevos elementos escritos.
     overrun()
@@ -106,6 +164,9 @@ class FIFOBuffer(QtCore.QObject):
         se vacía).
     resized()
         Cuando el largo 'length' del buffer se cambia.
+    health(dict)
+        Como máximo una vez cada 'health_interval' segundos, al escribir, con
+        el resultado de 'health_status()'.
     
     Notes
     -----
@@ -115,6 +176,11 @@ class FIFOBuffer(QtCore.QObject):
     
     Para escribir más de un dato a la vez (step mayor a 1) deben indexarse en
     arrays o iterables cuyo primer índice recorra los distintos elementos.
+    Los métodos 'write_many' y 'read_many' escriben y leen bloques completos
+    con a lo sumo dos copias de slices (una si el bloque no pasa por el final
+    del buffer) y avisan con una única señal 'packets_filled' cuántos paquetes
+    completó la escritura, de modo que un productor que escribe de a bloques
+    no pierde avisos de paquetes.
     
     La lectura de un único elemento puede hacerse mediante el método 
     '__call__()' (sin argumentos). La escritura de un único elemento puede
@@ -146,6 +212,35 @@ class FIFOBuffer(QtCore.QObject):
     La clase es iterable para su lectura (VERSIÓN EXPERIMENTAL, HAY QUE REVISAR
     EL CÓDIGO).
     
+    El buffer mide su propio rendimiento: nivel de llenado ('fill_level'),
+    máximo nivel alcanzado ('high_water_mark'), tasas de escritura y lectura
+    en elementos por segundo ('write_rate', 'read_rate', promedios móviles
+    exponenciales), duración de cada operación ('write_latency',
+    'read_latency', sin contar los slots conectados a 'packet_filled') y el
+    tiempo estimado hasta un overrun ('time_to_overrun'). Con estos valores
+    pueden ajustarse el largo de los paquetes y del buffer a partir de datos
+    medidos.
+    
+    Con un tipo estructurado como init_object, cada elemento es un registro
+    que guarda los datos de una muestra junto con su metadata (por ejemplo,
+    un cuadro con su número de secuencia y su timestamp) en un único bloque
+    contiguo de memoria. Se escribe un registro pasando una tupla con un valor
+    por campo, y las lecturas de varios elementos devuelven un array de
+    registros del que cada campo se obtiene como vista (por ejemplo,
+    buffer.read(n)['data']). A diferencia de un buffer de objetos de Python,
+    los datos quedan contiguos y se copian en bloque.
+    
+    En modo 'latest', 'missed' cuenta los elementos descartados sin leer
+    desde la última reinicialización y 'last_missed' los descartados por la
+    última lectura, de modo que el lector sabe cuántos elementos se perdió.
+    
+    Los métodos 'read_segments' y 'read_view' leen sin copiar: devuelven vistas
+    del array del buffer (uno o dos segmentos contiguos si la lectura pasa por
+    el final del buffer, o siempre una única vista si el buffer es 'mirrored').
+    Las vistas siguen siendo válidas sólo hasta que el escritor vuelva a
+    escribir esas posiciones, por lo que el consumidor debe usarlas (o
+    copiarlas) antes de devolver el control al escritor.
+    
     To do
     -----
     - Implementar iterable para escritura.
@@ -153,19 +248,19 @@ class FIFOBuffer(QtCore.QObject):
     que los métodos '__call__', 'write' y 'read' interpreten por defecto los
     datos a  escribir/leer como paquetes de datos del largo 'default_step'
     correspondiente.
-    - Implementar mediciones de tiempos de las operaciones de lectura y
-    escritura.
-    - Implementar monitoreo del rendimiento del buffer para así anticipar
-    overruns y fallas.
     
     """
     
     filled = QtCore.pyqtSignal()
     packet_filled = QtCore.pyqtSignal()
+    packets_filled = QtCore.pyqtSignal(int)
     ended = QtCore.pyqtSignal()
     overrun = QtCore.pyqtSignal()
     reinitialized = QtCore.pyqtSignal()
     resized = QtCore.pyqtSignal()
+    health = QtCore.pyqtSignal(object)
+    
+    HEALTH_SMOOTHING = 0.1
     
     class OverrunPolicies(IntEnum):
         ERROR = auto()
@@ -174,6 +269,10 @@ class FIFOBuffer(QtCore.QObject):
         NONE = auto()
         CUSTOM = auto()
     
+    class Modes(IntEnum):
+        FIFO = auto()
+        LATEST = auto()
+    
     class EndPolicies(IntEnum):
         ERROR = auto()
         SKIP = auto()
@@ -186,11 +285,19 @@ class FIFOBuffer(QtCore.QObject):
                  packet_length=None,
                  init_object=float,
                  overrun_policy="error",
-                 end_policy="silent_skip"):
+                 end_policy="silent_skip",
+                 mirrored=False,
+                 storage=None,
+                 mode="fifo"):
         super().__init__()
         
         self._length = 1
         self._packet_length = 1
+        self._mirrored = bool(mirrored)
+        self._mirror = None
+        self._storage = None if storage is None else str(storage)
+        self._mode = self.Modes.FIFO
+        self.health_interval = 0.5
         self.reinitialize(init_object=0)
         
         self.init_object = init_object
@@ -199,6 +306,7 @@ class FIFOBuffer(QtCore.QObject):
         
         self.overrun_policy = overrun_policy
         self.end_policy = end_policy
+        self.mode = mode
     
     def __iter__(self):
         return self
@@ -248,25 +356,35 @@ class FIFOBuffer(QtCore.QObject):
             elif self.length > self._packet_length:
                 self.length = int(ceil(self._length/self._packet_length) * self._packet_length)
     
-#    @property
-#    def mode(self):
-#        return self._mode.name.lower()
-#    
-#    @mode.setter
-#    def mode(self, value):
-#        if isinstance(value, str):
-#            self._mode = self.Modes[value.upper()]
-#        elif isinstance(value, type(self.Modes(1))):
-#            self._mode = self.Modes(value)
-#        else:
-#            raise TypeError("Buffer mode must be a string with a valid mode. See 'Buffer.Modes'.")
-#        
-#        if self._mode == self.Modes.FIFO:
-#            self._rorder = 1
-#            self._worder = 1
-#        elif self._mode == self.Modes.LIFO:
-#            self._rorder = -1
-#            self._worder = 1
+    @property
+    def mode(self):
+        return self._mode.name.lower()
+    
+    @mode.setter
+    def mode(self, value):
+        if isinstance(value, str):
+            self._mode = self.Modes[value.upper()]
+        elif isinstance(value, type(self.Modes(1))):
+            self._mode = self.Modes(value)
+        else:
+            raise TypeError("Buffer mode must be a string with a valid mode. See 'Buffer.Modes'.")
+    
+    def _read_count(self, step):
+        # Number of elements a read of 'step' takes. In LATEST mode, at most the unread (and not yet overwritten)
+        # ones, newest last: the unread elements older than them are dropped
+        if self._mode != self.Modes.LATEST:
+            return step
+        
+        available = self._wctr - self._rctr
+        count = min(step, available, self._length)
+        skipped = available - count
+        self.last_missed = skipped
+        if skipped:
+            self.missed += skipped
+            self._rctr += skipped
+            self._ridx = self._rctr % self._length
+        
+        return count
     
     @property
     def overrun_policy(self):
@@ -368,23 +486,168 @@ class FIFOBuffer(QtCore.QObject):
             self._ridx = (self._ridx + step * self._rorder) % self._length
     
     def read(self, step=1):
+        start = perf_counter()
+        count = self._read_count(step)
         self._check_ended()
         
         # Read if there is no skip signal
-        if self._rskip == 0:
+        if self._rskip != 0:
+            self._rskip -= 1
+            value = None
+        elif count == 0:
+            value = None
+        else:
             if step == 1:
                 value = self._data[self._ridx]
             else:
-                value = self._data[self.oldest_indices(step)]
+                value = self._data[self.oldest_indices(count)]
                 
+            self._rctr += count * self._rorder
+            self._rnext(count)
+            self._record_read(count, start)
+        
+        return value
+    
+    def read_segments(self, step=1):
+        """
+        Lee `step` elementos sin copiarlos. Devuelve una tupla con una vista
+        del buffer, o con dos si la lectura pasa por el final del buffer (en
+        orden de escritura).
+        """
+        start_time = perf_counter()
+        step = self._read_count(step)
+        self._check_ended()
+        
+        if self._rskip != 0:
+            self._rskip -= 1
+            segments = None
+        elif step == 0:
+            segments = None
+        else:
+            start = self._ridx
+            first = min(step, self._length - start)
+            
+            if first == step:
+                segments = (self._data[start:start+step], )
+            else:
+                segments = (self._data[start:], self._data[0:step-first])
+            
             self._rctr += step * self._rorder
             self._rnext(step)
-        else:
+            self._record_read(step, start_time)
+        
+        return segments
+    
+    def read_view(self, step=1):
+        """
+        Lee `step` elementos como un único array contiguo. Es una vista del
+        buffer si el buffer es 'mirrored' o si la lectura no pasa por el final
+        del buffer; en caso contrario, es una copia.
+        """
+        if not self._mirrored:
+            segments = self.read_segments(step)
+            if segments is None or len(segments) == 1:
+                return None if segments is None else segments[0]
+            return concatenate(segments)
+        
+        start = perf_counter()
+        step = self._read_count(step)
+        self._check_ended()
+        
+        if self._rskip != 0:
             self._rskip -= 1
             value = None
+        elif step == 0:
+            value = None
+        else:
+            value = self._mirror[self._ridx:self._ridx+step]
+            
+            self._rctr += step * self._rorder
+            self._rnext(step)
+            self._record_read(step, start)
         
         return value
     
+    def _record_write(self, step, start):
+        now = perf_counter()
+        alpha = self.HEALTH_SMOOTHING
+        
+        self.write_latency += alpha * (now - start - self.write_latency)
+        if self._last_write is not None and now > self._last_write:
+            self.write_rate += alpha * (step / (now - self._last_write) - self.write_rate)
+        self._last_write = now
+        
+        fill_level = self._wctr - self._rctr
+        if fill_level > self.high_water_mark:
+            self.high_water_mark = fill_level
+        
+        if now - self._last_health >= self.health_interval:
+            self._last_health = now
+            self.health.emit(self.health_status())
+    
+    def _record_read(self, step, start):
+        now = perf_counter()
+        alpha = self.HEALTH_SMOOTHING
+        
+        self.read_latency += alpha * (now - start - self.read_latency)
+        if self._last_read is not None and now > self._last_read:
+            self.read_rate += alpha * (step / (now - self._last_read) - self.read_rate)
+        self._last_read = now
+    
+    def reset_health(self):
+        self.high_water_mark = 0
+        self.write_rate = 0.
+        self.read_rate = 0.
+        self.write_latency = 0.
+        self.read_latency = 0.
+        self._last_write = None
+        self._last_read = None
+        self._last_health = 0.
+    
+    @property
+    def fill_level(self):
+        # Unread elements beyond the length were overwritten (LATEST mode)
+        return min(self._wctr - self._rctr, self._length)
+    
+    @property
+    def fill_fraction(self):
+        return self.fill_level / self._length
+    
+    @property
+    def time_to_overrun(self):
+        """
+        Tiempo estimado en segundos hasta que el buffer se llene, según las
+        tasas de escritura y lectura actuales. Infinito si la lectura sigue el
+        ritmo de la escritura.
+        """
+        net_rate = self.write_rate - self.read_rate
+        if net_rate <= 0 or self._mode == self.Modes.LATEST:
+            return float('inf')
+        
+        return (self._length - self.fill_level) / net_rate
+    
+    def health_status(self):
+        return {'length': self._length,
+                'fill_level': self.fill_level,
+                'fill_fraction': self.fill_fraction,
+                'high_water_mark': self.high_water_mark,
+                'write_rate': self.write_rate,
+                'read_rate': self.read_rate,
+                'write_latency': self.write_latency,
+                'read_latency': self.read_latency,
+                'time_to_overrun': self.time_to_overrun}
+    
+    @property
+    def mirrored(self):
+        return self._mirrored
+    
+    def _update_mirror(self, start, step):
+        # Copy the slots just written to the upper half of the mirror
+        first = min(step, self._length - start)
+        self._mirror[self._length+start:self._length+start+first] = self._data[start:start+first]
+        if first < step:
+            self._mirror[self._length:self._length+step-first] = self._data[0:step-first]
+    
     @property
     def write_counter(self):
         return self._wctr
@@ -399,7 +662,8 @@ class FIFOBuffer(QtCore.QObject):
             self._widx = (self._widx + step  * self._worder) % self._length
     
     def write(self, value, step=1):
-        self._check_overrun()
+        start = perf_counter()
+        self._check_overrun(step)
         
         # Write if there is no skip signal
         if self._wskip == 0:
@@ -413,17 +677,102 @@ class FIFOBuffer(QtCore.QObject):
                     self._data[self._widx:self._widx+step] = value
                 else:
                     first_chunk_size = self._length - self._widx
-                    second_chunk_size = value.length - first_chunk_size
+                    second_chunk_size = len(value) - first_chunk_size
                     self._data[self._widx:] = value[0:first_chunk_size]
                     self._data[0:second_chunk_size] = value[first_chunk_size:]
             
+            if self._mirrored:
+                self._update_mirror(self._widx, step)
+            
             self._wnext(step-1)
             self._wctr += step * self._worder
-            self._check_packet()
-            self._check_filled()
+            self._record_write(step, start)
+            self._check_packet(step)
+            self._check_filled(step)
         else:
             self._wskip = 0
     
+    def write_many(self, values):
+        """
+        Escribe en bloque los elementos de `values` (indexados en la primer
+        dimensión). Devuelve la cantidad de elementos escritos: todos, o
+        ninguno si la escritura se saltea por un overrun.
+        """
+        start_time = perf_counter()
+        step = len(values)
+        if step == 0:
+            return 0
+        if step > self._length:
+            raise ValueError("Cannot write {} elements at once in a buffer of length {}.".format(step, self._length))
+        
+        self._check_overrun(step)
+        if self._wskip != 0:
+            self._wskip = 0
+            return 0
+        
+        start = (self._widx + 1) % self._length
+        first = min(step, self._length - start)
+        self._data[start:start+first] = values[0:first]
+        if first < step:
+            self._data[0:step-first] = values[first:step]
+        
+        if self._mirrored:
+            self._update_mirror(start, step)
+        
+        self._widx = (self._widx + step) % self._length
+        self._wctr += step
+        self._record_write(step, start_time)
+        self._check_packet(step)
+        self._check_filled(step)
+        
+        return step
+    
+    def read_many(self, step, out=None):
+        """
+        Lee en bloque hasta `step` elementos (los disponibles, si son menos).
+        Devuelve una copia, en `out` si se da (debe tener lugar para `step`
+        elementos), o None si no hay elementos para leer.
+        """
+        start_time = perf_counter()
+        step = self._read_count(step)
+        self._check_ended()
+        
+        if self._rskip != 0:
+            self._rskip -= 1
+            return None
+        
+        step = min(step, self._wctr - self._rctr)
+        out = self._copy_out(self._ridx, step, out)
+        
+        self._rctr += step
+        self._rnext(step)
+        self._record_read(step, start_time)
+        
+        return out
+    
+    def _copy_out(self, start, step, out=None):
+        # Copies 'step' elements from index 'start' on, with at most two slice assignments
+        if out is None:
+            out = empty((step, ) + self.inner_size, dtype=self.dtype)
+        
+        first = min(step, self._length - start)
+        out[0:first] = self._data[start:start+first]
+        if first < step:
+            out[first:step] = self._data[0:step-first]
+        
+        return out[0:step]
+    
+    def _view(self, start, step):
+        # A single array with 'step' elements from index 'start' on: a view unless it wraps in a plain buffer
+        if self._mirrored:
+            return self._mirror[start:start+step]
+        
+        first = min(step, self._length - start)
+        if first == step:
+            return self._data[start:start+step]
+        
+        return concatenate((self._data[start:], self._data[0:step-first]))
+    
     def newest_indices(self, num=None):
         if isinstance(num, type(None)):
             num = self.length
@@ -436,12 +785,16 @@ class FIFOBuffer(QtCore.QObject):
         
         return (self._ridx + arange(num)) % self._length
     
-    def _check_packet(self):
-        if self._wctr != 0 and self._wctr % self._packet_length == 0:
+    def _check_packet(self, step=1):
+        # Packets completed by the last 'step' elements written
+        packets = self._wctr // self._packet_length - (self._wctr - step) // self._packet_length
+        if packets > 0:
             self.packet_filled.emit()
+            self.packets_filled.emit(packets)
     
-    def _check_filled(self):
-        if self._widx == 0 and self._wctr != 0:
+    def _check_filled(self, step=1):
+        # Whether the first slot was among the last 'step' elements written
+        if (self._wctr - 1) // self._length > (self._wctr - step - 1) // self._length:
             self.filled.emit()
     
     def _check_ended(self):
@@ -449,8 +802,12 @@ class FIFOBuffer(QtCore.QObject):
             self.ended.emit()
             self.handle_end(self)
     
-    def _check_overrun(self):
-        if (self._wctr - self._rctr) >= self._length:
+    def _check_overrun(self, step=1):
+        # In LATEST mode the writer overwrites unread elements instead
+        if self._mode == self.Modes.LATEST:
+            return None
+        
+        if (self._wctr - self._rctr) + step > self._length:
             self.overrun.emit()
             self.handle_overrun(self)
     
@@ -463,32 +820,76 @@ class FIFOBuffer(QtCore.QObject):
         if isinstance(value, type(None)):
             self.dtype = object
             self.inner_size = ()
-            data_size = (self.length, ) + self.inner_size
-            self._data = zeros(data_size, dtype=self.dtype)
+            fill = None
         elif isinstance(value, type):
             self.dtype = value
             self.inner_size = ()
-            data_size = (self.length, ) + self.inner_size
-            self._data = zeros(data_size, dtype=self.dtype)
+            fill = None
+        elif isinstance(value, np_dtype):
+            # A subarray dtype describes the shape of each element
+            self.dtype = value.base
+            self.inner_size = value.shape
+            fill = None
         elif isscalar(value):
             self.inner_size = ()
-            data_size = (self.length, ) + self.inner_size
-            self._data = full(data_size, fill_value=value, dtype=None)
-            self.dtype = self._data.dtype
+            fill = array(value)
+            self.dtype = fill.dtype
         elif isinstance(value, ndarray):
             self.inner_size = value.shape
-            data_size = (self.length, ) + self.inner_size
-            self._data = broadcast_to(value, data_size).copy()
-            self.dtype = self._data.dtype
+            # Copied, since the value may be a slot of the storage about to be replaced
+            fill = array(value)
+            self.dtype = fill.dtype
+        else:
+            raise TypeError("Value if 'init_object' must be either a type, a numpy.dtype, a scalar or a numpy.ndarray.")
+        
+        # The mirror is a second copy of the data right after the first one
+        rows = 2 * self.length if self._mirrored else self.length
+        storage = self._allocate((rows, ) + self.inner_size, self.dtype)
+        if fill is not None:
+            storage[...] = fill
+        
+        if self._mirrored:
+            self._mirror = storage
+            self._data = storage[0:self.length]
         else:
-            raise TypeError("Value if 'init_object' must be either a type, a scalar or a numpy.ndarray.")
+            self._data = storage
         
-        self._init_object = self._data[0]
+        if self._storage is None:
+            self._init_object = self._data[0]
+        else:
+            self._init_object = array(self._data[0])
+    
+    def _allocate(self, shape, dtype):
+        if self._storage is None:
+            return zeros(shape, dtype=dtype)
+        
+        if np_dtype(dtype).hasobject:
+            raise TypeError("Buffers of Python objects cannot be stored in a file. Use a numeric 'init_object'.")
+        
+        # Release the previous mapping before truncating its file
+        self._data = None
+        self._mirror = None
+        
+        return memmap(self._storage, dtype=dtype, mode='w+', shape=shape)
+    
+    @property
+    def storage(self):
+        return self._storage
+    
+    @storage.setter
+    def storage(self, value):
+        self._storage = None if value is None else str(value)
+        self.reinitialize()
     
     @property
     def data(self):
         return self._data
     
+    @property
+    def fields(self):
+        """Nombres de los campos de los elementos, si el buffer es de registros; si no, None."""
+        return np_dtype(self.dtype).names
+    
     def reinitialize(self, init_object=None):
         if init_object is None:
             init_object = self._init_object
@@ -501,6 +902,9 @@ class FIFOBuffer(QtCore.QObject):
         self._widx = -1
         self._rorder = 1
         self._worder = 1
+        self.missed = 0
+        self.last_missed = 0
+        self.reset_health()
         
         self.init_object = init_object
         self.reinitialized.emit()
@@ -509,6 +913,396 @@ class FIFOBuffer(QtCore.QObject):
         warn("Buffer overrun at {}".format(self))
 
 
+class BufferReader(QtCore.QObject):
+    """
+    Cursor de lectura independiente sobre un `FanOutBuffer`. Se crea mediante
+    `FanOutBuffer.add_reader`.
+    
+    Parameters
+    ----------
+    buffer : FanOutBuffer
+        Buffer del cual lee.
+    mode : {'fifo', 'latest'}
+        En modo 'fifo' el lector recibe todos los elementos en orden y el
+        escritor no sobrescribe sus elementos no leídos (si no hay lugar, el
+        buffer aplica su 'overrun_policy'). En modo 'latest' el escritor no
+        lo espera: cada lectura devuelve los elementos más nuevos y los
+        anteriores no leídos se descartan ('missed', 'last_missed').
+    packet_length : int
+        Cantidad de elementos por paquete para las señales 'packet_filled' y
+        'packets_filled' del lector. Por defecto, el del buffer.
+    name : str
+        Nombre del lector, para identificarlo.
+    
+    pyQt Signals
+    ------------
+    packet_filled()
+        Cuando hay al menos un paquete nuevo para este lector.
+    packets_filled(int)
+        Junto con packet_filled, con la cantidad de paquetes nuevos.
+    overrun()
+        Cuando el escritor no pudo escribir por elementos no leídos de este
+        lector (sólo en modo 'fifo').
+    """
+    
+    packet_filled = QtCore.pyqtSignal()
+    packets_filled = QtCore.pyqtSignal(int)
+    overrun = QtCore.pyqtSignal()
+    
+    def __init__(self, buffer, mode="fifo", packet_length=None, name=None):
+        super().__init__()
+        
+        self.buffer = buffer
+        self.name = name
+        self.packet_length = buffer.packet_length if packet_length is None else int(packet_length)
+        self.mode = mode
+        self.reset()
+    
+    def __repr__(self):
+        return "<BufferReader '{}' ({})>".format(self.name, self.mode)
+    
+    @property
+    def mode(self):
+        return self._mode.name.lower()
+    
+    @mode.setter
+    def mode(self, value):
+        if isinstance(value, str):
+            self._mode = FIFOBuffer.Modes[value.upper()]
+        elif isinstance(value, type(FIFOBuffer.Modes(1))):
+            self._mode = FIFOBuffer.Modes(value)
+        else:
+            raise TypeError("Reader mode must be a string with a valid mode. See 'FIFOBuffer.Modes'.")
+    
+    @property
+    def blocking(self):
+        return self._mode == FIFOBuffer.Modes.FIFO
+    
+    def reset(self):
+        # New readers start at the next element written
+        self.read_counter = self.buffer.write_counter
+        self.overruns = 0
+        self.missed = 0
+        self.last_missed = 0
+    
+    @property
+    def pending(self):
+        return min(self.buffer.write_counter - self.read_counter, self.buffer.length)
+    
+    def _advance(self, step):
+        # Drops what the writer already overwrote and, in LATEST mode, all but the newest 'step' elements
+        available = self.buffer.write_counter - self.read_counter
+        skipped = max(available - self.buffer.length, 0)
+        if self._mode == FIFOBuffer.Modes.LATEST:
+            skipped = max(available - step, 0)
+        
+        self.last_missed = skipped
+        self.missed += skipped
+        self.read_counter += skipped
+        
+        return min(step, available - skipped)
+    
+    def read(self, step=1, out=None):
+        """
+        Copia hasta `step` elementos (los disponibles, si son menos), en `out`
+        si se da. Devuelve None si no hay elementos nuevos.
+        """
+        step = self._advance(step)
+        if step == 0:
+            return None
+        
+        value = self.buffer._copy_out(self.read_counter % self.buffer.length, step, out)
+        self.read_counter += step
+        
+        return value
+    
+    def read_view(self, step=1):
+        """
+        Como 'read', pero devuelve una vista del buffer (ver
+        'FIFOBuffer.read_view'), válida hasta que el escritor vuelva a
+        escribir esas posiciones.
+        """
+        step = self._advance(step)
+        if step == 0:
+            return None
+        
+        value = self.buffer._view(self.read_counter % self.buffer.length, step)
+        self.read_counter += step
+        
+        return value
+    
+    def _check_packet(self, step):
+        write_counter = self.buffer.write_counter
+        packets = write_counter // self.packet_length - (write_counter - step) // self.packet_length
+        if packets > 0:
+            self.packet_filled.emit()
+            self.packets_filled.emit(packets)
+    
+    def close(self):
+        self.buffer.remove_reader(self)
+
+
+class FanOutBuffer(FIFOBuffer):
+    """
+    FIFOBuffer con un único escritor y varios lectores independientes
+    (guardado, FFT, streaming por red, visualización) sobre el mismo array de
+    datos, sin copias por consumidor.
+    
+    Acepta los mismos parámetros que FIFOBuffer. Además de los lectores
+    creados con 'add_reader', el propio buffer conserva su cursor de lectura
+    ('read', 'read_view', etc.), que se comporta como un lector más según
+    'mode'. Por defecto 'mode' es 'latest', de modo que ese cursor no detiene
+    al escritor si nadie lo usa.
+    
+    Cada lector ('BufferReader') tiene su propio contador de lectura, modo,
+    largo de paquete, señales y contadores de overruns y de elementos
+    descartados. El escritor sólo espera a los lectores en modo 'fifo': si
+    escribir sobrescribiría elementos que alguno de ellos no leyó, se emite
+    'overrun' del buffer y de esos lectores y se aplica 'overrun_policy'. Los
+    lectores en modo 'latest' nunca frenan al escritor.
+    
+    Ejemplo
+    -------
+    >>> buffer = FanOutBuffer(length=64, init_object=frame, overrun_policy='silent_skip')
+    >>> saver = buffer.add_reader('save', mode='fifo', packet_length=16)
+    >>> display = buffer.add_reader('display', mode='latest', packet_length=1)
+    >>> saver.packet_filled.connect(lambda: save(saver.read(16)))
+    >>> display.packet_filled.connect(lambda: show(display.read_view(1)[0]))
+    """
+    
+    _readers = ()
+    
+    def __init__(self, *args, mode="latest", **kwargs):
+        super().__init__(*args, mode=mode, **kwargs)
+        
+        self._readers = []
+    
+    @property
+    def readers(self):
+        return tuple(self._readers)
+    
+    def add_reader(self, name=None, mode="fifo", packet_length=None):
+        reader = BufferReader(self, mode=mode, packet_length=packet_length, name=name)
+        self._readers.append(reader)
+        
+        return reader
+    
+    def remove_reader(self, reader):
+        if reader in self._readers:
+            self._readers.remove(reader)
+    
+    def _check_overrun(self, step=1):
+        blocked = False
+        for reader in self._readers:
+            if reader.blocking and self._wctr - reader.read_counter + step > self._length:
+                reader.overruns += 1
+                reader.overrun.emit()
+                blocked = True
+        
+        if blocked:
+            self.overrun.emit()
+            self.handle_overrun(self)
+        else:
+            super()._check_overrun(step)
+    
+    def _check_packet(self, step=1):
+        super()._check_packet(step)
+        
+        for reader in self._readers:
+            reader._check_packet(step)
+    
+    def reinitialize(self, init_object=None):
+        super().reinitialize(init_object)
+        
+        for reader in self._readers:
+            reader.reset()
+
+
+class RingSignals(QtCore.QObject):
+    """
+    Señales opcionales de `SPSCRing`. Se emiten desde el hilo que escribe, de modo que los slots de objetos que viven en
+    otro hilo se ejecutan en ese hilo (conexión encolada de Qt).
+    """
+    packet_filled = QtCore.pyqtSignal(int)
+    overrun = QtCore.pyqtSignal()
+
+
+class SPSCRing:
+    """
+    Buffer circular para un único hilo productor y un único hilo consumidor ("single-producer, single-consumer").
+    
+    Cada posición guarda un registro de forma y tipo fijos en un array de numpy preasignado de dimensiones
+    `(length,) + shape`. El productor sólo modifica el contador de escritura y el consumidor sólo el de lectura, y cada
+    uno publica su contador recién después de copiar los datos, de modo que no hacen falta locks: el consumidor nunca
+    ve una posición a medio escribir y el productor nunca sobrescribe una posición que no fue leída.
+    
+    Parameters
+    ----------
+    length : int
+        Cantidad de registros del buffer.
+    shape : tuple, opcional
+        Forma de cada registro (por defecto: (), un escalar).
+    dtype : numpy.dtype, opcional
+        Tipo de datos de los registros (por defecto: float).
+    packet_length : int, opcional
+        Si se habilitan las señales, `packet_filled` se emite cada `packet_length` registros escritos (por defecto: 1).
+    signals : bool, opcional
+        Si es True, crea un objeto `RingSignals` en el atributo `signals` (por defecto: False, sin dependencia de Qt
+        en el camino de escritura).
+    
+    Notes
+    -----
+    `read` nunca espera: devuelve una copia de hasta `n` registros disponibles (posiblemente ninguno). Para esperar
+    datos, el consumidor puede llamar a `wait_readable`.
+    
+    `write` espera a que haya lugar si `block=True` (opcionalmente con `timeout`); `write_nowait` no espera y, si el
+    buffer está lleno, descarta los registros, los suma a `overruns` y devuelve False.
+    
+    La seguridad entre hilos depende de que haya un único productor y un único consumidor. Con más de un hilo de cada
+    lado, hay que sincronizarlos externamente.
+    
+    Ejemplo::
+    
+        ring = SPSCRing(64, shape=(1024, 1280), dtype=np.uint16)
+        
+        # Hilo de adquisición
+        ring.write(frame)
+        
+        # Hilo de guardado
+        if ring.wait_readable(timeout=1):
+            frames = ring.read(16)
+    """
+    
+    def __init__(self, length, shape=(), dtype=float, packet_length=1, signals=False):
+        self.length = int(length)
+        self.shape = tuple(shape)
+        self.dtype = np_dtype(dtype)
+        self.packet_length = int(packet_length)
+        self.signals = RingSignals() if signals else None
+        
+        if self.length < 1:
+            raise ValueError("Ring length {} is less than minimum value of 1.".format(self.length))
+        
+        self._data = empty((self.length,) + self.shape, dtype=self.dtype)
+        self._wctr = 0
+        self._rctr = 0
+        self.overruns = 0
+        
+        self._space = Event()
+        self._available = Event()
+        self._writer_waiting = False
+        self._reader_waiting = False
+    
+    def __len__(self):
+        return self._wctr - self._rctr
+    
+    @property
+    def write_counter(self):
+        return self._wctr
+    
+    @property
+    def read_counter(self):
+        return self._rctr
+    
+    @property
+    def free(self):
+        return self.length - (self._wctr - self._rctr)
+    
+    def _as_records(self, value):
+        value = value if isinstance(value, ndarray) else zeros((), dtype=self.dtype) + value
+        
+        # A single record is written as a batch of one
+        if value.shape == self.shape:
+            return value.reshape((1,) + self.shape)
+        
+        return value
+    
+    def _store(self, records):
+        count = len(records)
+        start = self._wctr % self.length
+        first = min(count, self.length - start)
+        
+        self._data[start:start + first] = records[0:first]
+        if first < count:
+            self._data[0:count - first] = records[first:]
+        
+        # Publish only after the data is in place
+        self._wctr += count
+        
+        if self._reader_waiting:
+            self._available.set()
+        
+        if self.signals is not None and self._wctr // self.packet_length != (self._wctr - count) // self.packet_length:
+            self.signals.packet_filled.emit(self._wctr)
+    
+    def write(self, value, block=True, timeout=None):
+        """
+        Escribe un registro (o un array de registros en la primera dimensión). Devuelve False si no hubo lugar.
+        """
+        records = self._as_records(value)
+        
+        if len(records) > self.length:
+            raise ValueError("Cannot write {} records to a ring of length {}.".format(len(records), self.length))
+        
+        while self.free < len(records):
+            if not block:
+                self.overruns += len(records)
+                if self.signals is not None:
+                    self.signals.overrun.emit()
+                return False
+            
+            # Re-check after clearing, in case the reader freed space in between
+            self._space.clear()
+            self._writer_waiting = True
+            if self.free < len(records) and not self._space.wait(timeout):
+                self._writer_waiting = False
+                return self.write(records, block=False)
+            self._writer_waiting = False
+        
+        self._store(records)
+        
+        return True
+    
+    def write_nowait(self, value):
+        return self.write(value, block=False)
+    
+    def read(self, n=1):
+        """
+        Devuelve una copia de los `n` registros más viejos sin leer (o de todos los disponibles, si son menos), como un
+        array de dimensiones `(k,) + shape` con `k <= n`.
+        """
+        count = min(int(n), self._wctr - self._rctr)
+        start = self._rctr % self.length
+        first = min(count, self.length - start)
+        
+        out = empty((count,) + self.shape, dtype=self.dtype)
+        out[0:first] = self._data[start:start + first]
+        if first < count:
+            out[first:] = self._data[0:count - first]
+        
+        # Release the slots only after copying them
+        self._rctr += count
+        
+        if self._writer_waiting:
+            self._space.set()
+        
+        return out
+    
+    def wait_readable(self, timeout=None, n=1):
+        """
+        Espera hasta que haya al menos `n` registros sin leer. Devuelve False si se agota el `timeout`.
+        """
+        while self._wctr - self._rctr < n:
+            self._available.clear()
+            self._reader_waiting = True
+            if self._wctr - self._rctr < n and not self._available.wait(timeout):
+                self._reader_waiting = False
+                return False
+            self._reader_waiting = False
+        
+        return True
+
+
 class BufferCore(QtCore.QObject):
     
     was_filled = QtCore.pyqtSignal()
@@ -566,6 +1360,13 @@ class BufferCore(QtCore.QObject):
     @length.setter
     def length(self, value):
         self._length = int(value)
+        
+        # Two laps of indices, so that every ordering is a contiguous slice (see 'indices_old_first')
+        self._ascending = arange(2 * self._length) % self._length
+        self._descending = self._ascending[::-1].copy()
+        self._ascending.flags.writeable = False
+        self._descending.flags.writeable = False
+        
         self.reset()
         
         self.was_resized.emit()
@@ -578,11 +1379,14 @@ class BufferCore(QtCore.QObject):
     
     @property
     def indices_new_first(self):
-        return (self.index-1 - arange(self.length)) % self.length
+        """Índices del más nuevo al más viejo. Es una vista de sólo lectura, sin copias."""
+        offset = (self._length - self._index) % self._length
+        return self._descending[offset:offset+self._length]
     
     @property
     def indices_old_first(self):
-        return (arange(self.length) - self.index) % self.length
+        """Índices del más viejo al más nuevo. Es una vista de sólo lectura, sin copias."""
+        return self._ascending[self._index:self._index+self._length]
 
 
 
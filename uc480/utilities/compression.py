@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 17:42:26 2026
+
+@author: Axel Lacapmesure
+"""
+
+import numpy as np
+
+from time import perf_counter
+
+import zlib
+import lzma
+import bz2
+
+try:
+    import lz4.frame as lz4
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def shuffle_bytes(array):
+    """
+    Reordena los bytes de un array agrupando el byte i-ésimo de todos los elementos. Para datos de 10 bits en
+    contenedores de 16 bits, el byte alto queda como una secuencia de valores entre 0 y 3 que se comprime mucho mejor.
+    """
+    array = np.ascontiguousarray(array)
+    itemsize = array.dtype.itemsize
+
+    if itemsize == 1:
+        return array.view(np.uint8).reshape(-1)
+
+    return array.view(np.uint8).reshape(-1, itemsize).T.copy().reshape(-1)
+
+
+def unshuffle_bytes(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    data = np.frombuffer(data, dtype=np.uint8)
+
+    if dtype.itemsize == 1:
+        return data.view(dtype).reshape(shape)
+
+    return data.reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(shape)
+
+
+class Codec:
+    """
+    Compresor sin pérdida de cuadros.
+
+    Parameters
+    ----------
+    name : str
+        Nombre del códec (ver `CODECS`).
+    compress, decompress : Callable
+        Funciones de compresión y descompresión de bytes.
+    shuffle : bool, opcional
+        Si es True, reordena los bytes del cuadro antes de comprimirlo (ver `shuffle_bytes`). Por defecto: True.
+    """
+
+    def __init__(self, name, compress, decompress, shuffle=True):
+        self.name = name
+        self.shuffle = shuffle
+        self._compress = compress
+        self._decompress = decompress
+
+    def __repr__(self):
+        return "<Codec '{}'{}>".format(self.name, ' (shuffle)' if self.shuffle else '')
+
+    @property
+    def label(self):
+        return self.name + ('+shuffle' if self.shuffle else '')
+
+    def encode(self, array):
+        array = np.ascontiguousarray(array)
+        data = shuffle_bytes(array) if self.shuffle else array.view(np.uint8).reshape(-1)
+
+        return self._compress(memoryview(data))
+
+    def decode(self, data, dtype, shape):
+        data = self._decompress(bytes(data))
+
+        if self.shuffle:
+            return unshuffle_bytes(data, dtype, shape)
+
+        return np.frombuffer(data, dtype=dtype).reshape(shape)
+
+
+def _zstd_codec(level=3):
+    compressor = zstandard.ZstdCompressor(level=level)
+    decompressor = zstandard.ZstdDecompressor()
+
+    return compressor.compress, decompressor.decompress
+
+
+# Name -> factory of (compress, decompress) with the default (fast) level
+CODECS = {'none': lambda: (bytes, bytes),
+          'zlib': lambda: (lambda data: zlib.compress(data, 1), zlib.decompress),
+          'lzma': lambda: (lambda data: lzma.compress(data, preset=0), lzma.decompress),
+          'bz2': lambda: (lambda data: bz2.compress(data, 1), bz2.decompress)}
+
+if lz4 is not None:
+    CODECS['lz4'] = lambda: (lz4.compress, lz4.decompress)
+
+if zstandard is not None:
+    CODECS['zstd'] = _zstd_codec
+
+
+# Codecs that compress at a few MB/s: only worth measuring for slow data rates (in MB/s)
+SLOW_CODECS = ('lzma', 'bz2')
+SLOW_CODECS_MAX_RATE = 5.
+
+
+def candidate_codecs(data_rate):
+    """Códecs disponibles con una velocidad plausible para la tasa de datos `data_rate` (en MB/s)."""
+    return [name for name in CODECS if name not in SLOW_CODECS or data_rate <= SLOW_CODECS_MAX_RATE]
+
+
+def get_codec(name, shuffle=True):
+    """
+    Devuelve el `Codec` de nombre `name`. Acepta también nombres con el sufijo '+shuffle' (como los de
+    `Codec.label`), en cuyo caso el reordenamiento de bytes se activa independientemente de `shuffle`.
+    """
+    if isinstance(name, Codec):
+        return name
+
+    name = 'none' if name is None else str(name).lower()
+    if name.endswith('+shuffle'):
+        name = name[:-len('+shuffle')]
+        shuffle = True
+
+    if name not in CODECS:
+        raise ValueError("Unknown or unavailable codec '{}'. Available codecs: {}.".format(name, ', '.join(CODECS)))
+
+    compress, decompress = CODECS[name]()
+
+    return Codec(name, compress, decompress, shuffle=shuffle and name != 'none')
+
+
+def synthetic_frames(count=8, shape=(1024, 1280), bit_depth=10, seed=0):
+    """
+    Cuadros de prueba representativos de un espectrómetro: una franja gaussiana con modulación espectral sobre un fondo
+    oscuro, con ruido de Poisson y de lectura, en contenedores uint8 (8 bits) o uint16 (más de 8 bits).
+    """
+    rng = np.random.default_rng(seed)
+    levels = 2 ** bit_depth - 1
+    dtype = np.uint8 if bit_depth <= 8 else np.uint16
+
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    stripe = np.exp(-(y - shape[0] / 2) ** 2 / (2 * (shape[0] / 20) ** 2))
+    spectrum = 0.5 + 0.4 * np.cos(2 * np.pi * x / (shape[1] / 40)) * np.exp(-(x - shape[1] / 2) ** 2 / shape[1] ** 2)
+    signal = 0.02 * levels + 0.7 * levels * stripe * spectrum
+
+    frames = np.empty((count,) + tuple(shape), dtype=dtype)
+    for idx in range(count):
+        frame = rng.poisson(signal) + rng.normal(0, 2, shape)
+        frames[idx] = np.clip(frame, 0, levels).astype(dtype)
+
+    return frames
+
+
+def benchmark(frames=None, codecs=None, shuffle=(False, True), repeat=1):
+    """
+    Mide la velocidad de compresión y descompresión (en MB/s de datos sin comprimir) y la tasa de compresión de cada
+    códec sobre los cuadros `frames` (por defecto, `synthetic_frames()`).
+
+    Devuelve una lista de diccionarios con las claves 'codec', 'encode_MBps', 'decode_MBps' y 'ratio', ordenada de
+    mayor a menor tasa de compresión.
+    """
+    if frames is None:
+        frames = synthetic_frames()
+    if codecs is None:
+        codecs = list(CODECS)
+
+    frames = np.asarray(frames)
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+
+    results = []
+    for name in codecs:
+        for shuffled in ([False] if name == 'none' else shuffle):
+            codec = get_codec(name, shuffle=shuffled)
+
+            encode_time = np.inf
+            decode_time = np.inf
+            for _ in range(repeat):
+                start = perf_counter()
+                encoded = [codec.encode(frame) for frame in frames]
+                encode_time = min(encode_time, perf_counter() - start)
+
+                start = perf_counter()
+                for data, frame in zip(encoded, frames):
+                    codec.decode(data, frame.dtype, frame.shape)
+                decode_time = min(decode_time, perf_counter() - start)
+
+            megabytes = frames.nbytes / 1e6
+            results.append({'codec': codec.label,
+                            'encode_MBps': megabytes / max(encode_time, 1e-9),
+                            'decode_MBps': megabytes / max(decode_time, 1e-9),
+                            'ratio': frames.nbytes / max(sum(len(data) for data in encoded), 1)})
+
+    return sorted(results, key=lambda result: result['ratio'], reverse=True)
+
+
+def select_codec(data_rate, results=None, margin=2., **kwargs):
+    """
+    Elige el códec con mayor tasa de compresión cuya velocidad de compresión supera `margin` veces la tasa de datos
+    `data_rate` (en MB/s, por ejemplo `frame_rate * frame_bytes / 1e6`). Si ninguno alcanza, devuelve 'none'.
+
+    `results` es el resultado de `benchmark`; si no se da, se ejecuta `benchmark(**kwargs)`.
+    """
+    if results is None:
+        results = benchmark(**kwargs)
+
+    for result in results:
+        if result['encode_MBps'] >= margin * data_rate:
+            return result['codec']
+
+    return 'none'
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 11:02:15 2026
+
+@author: Axel Lacapmesure
+"""
+
+from lantz.qt import QtCore
+
+import numpy as np
+
+from bisect import bisect_right
+
+from time import perf_counter
+
+
+class StageMetrics:
+    """
+    Métricas de una etapa del pipeline de adquisición (adquisición, procesado, guardado, etc.).
+
+    Cada etapa es actualizada por un único hilo (el que ejecuta la etapa), de modo que los contadores son enteros y
+    flotantes de Python sin locks: las lecturas desde otros hilos pueden estar desfasadas en un elemento pero nunca
+    corrompen el estado. El costo por elemento es de dos llamadas a `perf_counter` y una búsqueda binaria sobre los
+    bordes del histograma.
+
+    Parameters
+    ----------
+    name : str
+        Nombre de la etapa.
+    monitor : PipelineMonitor, opcional
+        Monitor al que pertenece la etapa. Se utiliza para conocer el tiempo disponible por elemento (`budget`) y para
+        notificar actualizaciones.
+
+    Notes
+    -----
+    Uso típico::
+
+        t0 = metrics.begin()
+        ...  # procesado
+        metrics.end(t0)
+
+    Si la etapa se ejecuta en otros hilos (como el guardado en paralelo), los tiempos se miden allí y se aplican desde
+    el hilo dueño con `end(t0, now=t1)`.
+
+    El histograma de latencias tiene bordes logarítmicos entre `LATENCY_MIN` y `LATENCY_MAX` segundos. El primer y
+    último bin acumulan los valores fuera de rango.
+
+    La etapa se considera sobrecargada cuando la latencia media móvil supera el tiempo disponible por elemento
+    (usualmente el intervalo entre cuadros de la cámara).
+    """
+
+    LATENCY_MIN = 1e-5
+    LATENCY_MAX = 10.
+    LATENCY_BINS = 36
+    SMOOTHING = 0.1
+
+    latency_edges = list(np.geomspace(LATENCY_MIN, LATENCY_MAX, LATENCY_BINS + 1))
+
+    def __init__(self, name, monitor=None):
+        self.name = name
+        self.monitor = monitor
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.dropped = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.latency_sum = 0.
+        self.latency_max = 0.
+        self.latency_mean = 0.
+        self.rate = 0.
+        self.first_time = None
+        self.last_time = None
+        self._histogram = [0] * (len(self.latency_edges) + 1)
+
+    @staticmethod
+    def begin():
+        return perf_counter()
+
+    def end(self, start, items=1, now=None):
+        if now is None:
+            now = perf_counter()
+        latency = now - start
+
+        self.count += items
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+        self._histogram[bisect_right(self.latency_edges, latency)] += 1
+
+        # Exponential moving averages for latency and throughput
+        alpha = self.SMOOTHING
+        if self.last_time is None:
+            self.first_time = start
+            self.latency_mean = latency
+        else:
+            self.latency_mean += alpha * (latency - self.latency_mean)
+            dt = now - self.last_time
+            if dt > 0:
+                self.rate += alpha * (items / dt - self.rate)
+        self.last_time = now
+
+        if self.monitor is not None:
+            self.monitor.notify(now)
+
+        return latency
+
+    def drop(self, items=1):
+        self.dropped += items
+
+    def set_queue_depth(self, value):
+        self.queue_depth = value
+        if value > self.max_queue_depth:
+            self.max_queue_depth = value
+
+    @property
+    def budget(self):
+        return None if self.monitor is None else self.monitor.budget
+
+    @property
+    def overloaded(self):
+        budget = self.budget
+        return bool(budget) and self.latency_mean > budget
+
+    @property
+    def throughput(self):
+        if self.first_time is None or self.last_time == self.first_time:
+            return 0.
+        return self.count / (self.last_time - self.first_time)
+
+    @property
+    def histogram(self):
+        return np.array(self._histogram)
+
+    def snapshot(self):
+        return {'name': self.name,
+                'count': self.count,
+                'dropped': self.dropped,
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'latency_mean': self.latency_mean,
+                'latency_max': self.latency_max,
+                'latency_average': self.latency_sum / self.count if self.count else 0.,
+                'latency_histogram': self.histogram,
+                'rate': self.rate,
+                'throughput': self.throughput,
+                'overloaded': self.overloaded}
+
+
+class PipelineMonitor(QtCore.QObject):
+    """
+    Monitor de tiempos del pipeline, compartido por `CameraControl`, `SpectraAnalyzer`, `FFTAnalyzer` y
+    `SaveManager`.
+
+    Agrupa instancias de `StageMetrics` por nombre y permite consultarlas de dos maneras: mediante el método
+    `snapshot()` (para scripts) o a través de la señal `updated`, que se emite con una frecuencia máxima dada por
+    `interval` (para widgets de la interfaz).
+
+    Parameters
+    ----------
+    interval : float, opcional
+        Tiempo mínimo en segundos entre emisiones de la señal `updated` (por defecto: 0.5).
+
+    pyQt Signals
+    ------------
+    updated(dict)
+        Resultado de `snapshot()`, emitido como máximo una vez cada `interval` segundos.
+
+    Notes
+    -----
+    La señal no depende de un QTimer: se evalúa cada vez que una etapa termina de procesar un elemento, por lo que
+    funciona también sin event loop (ver `uc480.core.headless`).
+    """
+
+    updated = QtCore.pyqtSignal(object)
+
+    def __init__(self, interval=0.5):
+        super().__init__()
+
+        self.interval = interval
+        self.budget = None
+        self._stages = {}
+        self._last_emit = perf_counter()
+
+    def __getitem__(self, name):
+        return self._stages[name]
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    def stage(self, name):
+        if name not in self._stages:
+            self._stages[name] = StageMetrics(name, monitor=self)
+        return self._stages[name]
+
+    @property
+    def stages(self):
+        return list(self._stages.values())
+
+    @property
+    def overloaded(self):
+        return any(stage.overloaded for stage in self._stages.values())
+
+    def set_frame_interval(self, value):
+        try:
+            value = value.to('s').magnitude
+        except AttributeError:
+            pass
+
+        self.budget = float(value) if value else None
+
+    def notify(self, now=None):
+        if now is None:
+            now = perf_counter()
+
+        if now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.updated.emit(self.snapshot())
+
+    def snapshot(self):
+        stages = {name: stage.snapshot() for name, stage in self._stages.items()}
+
+        return {'stages': stages,
+                'budget': self.budget,
+                'dropped': sum(stage['dropped'] for stage in stages.values()),
+                'overloaded': any(stage['overloaded'] for stage in stages.values())}
+
+    def reset(self):
+        for stage in self._stages.values():
+            stage.reset()
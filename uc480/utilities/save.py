@@ -6,12 +6,14 @@ Created on Thu Dec 13 10:32:43 2018
 """
 
 from .func import file_dialog_save
-from .buffer import FIFOBuffer
+from .buffer import FanOutBuffer, record_dtype
+from .writers import TableWriter, RecordingManifest
 
 from lantz.qt import QtCore
 from lantz.core import ureg
 
 import numpy as np
+from numpy.lib.recfunctions import repack_fields
 
 import os
 import sys
@@ -22,6 +24,18 @@ from enum import Enum, IntEnum, IntFlag, auto
 
 from datetime import datetime
 
+from collections import deque
+
+from queue import Queue
+
+from threading import Thread
+
+from time import perf_counter, time
+
+from types import FunctionType, BuiltinFunctionType, MethodType
+
+from warnings import warn
+
 
 class PATH:
     pass
@@ -31,6 +45,10 @@ class DATA:
     pass
 
 
+class METADATA:
+    pass
+
+
 class TRIGGER_RETURN:
     def __init__(self, index):
         self.index = index
@@ -56,6 +74,126 @@ class CallbackModes(IntFlag):
     PARALLEL = auto()
 
 
+class BackpressurePolicies(IntEnum):
+    NONE = auto()
+    WARN = auto()
+    DECIMATE = auto()
+    DEGRADE = auto()
+    CUSTOM = auto()
+
+
+class SaveThroughput:
+    """
+    Estimación de la tasa de entrada de muestras y de la capacidad de guardado de un `SaveManager`.
+
+    La tasa de entrada es un promedio móvil exponencial de las muestras que entran al buffer por segundo. La capacidad
+    de guardado es la cantidad de muestras (y de MB) que el callback guarda por segundo de trabajo, es decir, sin contar
+    el tiempo en que el guardado está ocioso esperando datos. El cociente entre ambas (`load`) indica si el guardado
+    sigue el ritmo de la adquisición: valores mayores a 1 implican que, tarde o temprano, se pierden datos.
+
+    En modo serie el guardado bloquea al emisor de la señal, de modo que el tiempo de guardado (`blocking=True` en
+    `saved`) se descuenta del intervalo entre muestras para estimar la tasa a la que llegarían sin bloqueo.
+    """
+
+    SMOOTHING = 0.1
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.input_rate = 0.
+        self.save_rate = 0.
+        self.write_rate = 0.
+        self.saved_items = 0
+        self.saved_bytes = 0
+        self._last_added = None
+        self._blocked = 0.
+
+    def added(self, now=None):
+        if now is None:
+            now = perf_counter()
+
+        if self._last_added is not None:
+            interval = now - self._last_added - self._blocked
+            if interval > 0:
+                self.input_rate += self.SMOOTHING * (1 / interval - self.input_rate)
+        self._last_added = now
+        self._blocked = 0.
+
+    def saved(self, items, duration, nbytes=0, blocking=False):
+        self.saved_items += items
+        self.saved_bytes += nbytes
+        if blocking:
+            self._blocked += duration
+
+        if duration > 0:
+            alpha = self.SMOOTHING if self.save_rate else 1.
+            self.save_rate += alpha * (items / duration - self.save_rate)
+            self.write_rate += alpha * (nbytes / duration / 1e6 - self.write_rate)
+
+    def load(self, workers=1):
+        if not self.save_rate:
+            return 0.
+        return self.input_rate / (self.save_rate * workers)
+
+
+class CaptureRing:
+    """
+    Anillo preasignado con las últimas `length` muestras (y su metadata) para la captura con pre-trigger de
+    `SaveManager`. Al llenarse, cada muestra nueva sobrescribe a la más vieja.
+
+    El almacenamiento se reserva con la primera muestra, con su misma forma y tipo de datos, y los arrays se copian en
+    él (las muestras de la cámara apuntan a la memoria del driver, que se sobrescribe). Las muestras que no son arrays
+    se guardan por referencia.
+    """
+
+    def __init__(self, length, metadata_dtype=None):
+        self.length = int(length)
+        self.metadata_dtype = metadata_dtype
+        self.clear()
+
+    def __len__(self):
+        return min(self.count, self.length)
+
+    def clear(self):
+        self.count = 0
+        self._data = None
+        self._metadata = None
+
+    def push(self, value, record=None):
+        if self.length < 1:
+            return None
+
+        if self._data is None:
+            if isinstance(value, np.ndarray):
+                self._data = np.empty((self.length,) + value.shape, dtype=value.dtype)
+            else:
+                self._data = np.empty(self.length, dtype=object)
+            if self.metadata_dtype is not None:
+                self._metadata = np.zeros(self.length, dtype=self.metadata_dtype)
+
+        index = self.count % self.length
+        self._data[index] = value
+        if self._metadata is not None:
+            self._metadata[index] = record
+        self.count += 1
+
+    def drain(self):
+        """
+        Devuelve las muestras guardadas de la más vieja a la más nueva, como `(data, metadata)` (metadata es None si no
+        se registra), y vacía el anillo.
+        """
+        if not len(self):
+            return [], None
+
+        order = (self.count + np.arange(-len(self), 0)) % self.length
+        data = self._data[order]
+        metadata = None if self._metadata is None else self._metadata[order]
+        self.count = 0
+
+        return data, metadata
+
+
 class SaveManager(QtCore.QObject):
     """
     Clase para implementar guardado de datos automatizado a partir de signals y slots de Qt.
@@ -100,8 +238,65 @@ class SaveManager(QtCore.QObject):
         lo cual significa que puede aceptar cualquier tipo de datos).
     callback_mode : Union[str, int, CallbackModes], opcional
         Establece si el guardado se ejecuta de forma secuencial respecto a la adquisición de datos (lo cual implica una
-        pausa en la adquisición de datos) o en paralelo (para una adquisición continua). Actualmente no implementado, lo
-        cual significa una escritura en serie.
+        pausa en la adquisición de datos) o en paralelo (para una adquisición continua). Por defecto, en serie.
+
+    Notes
+    -----
+    Mediante `set_metadata` puede registrarse metadata por muestra (por ejemplo, número de secuencia y timestamp). La
+    metadata se guarda en un array estructurado paralelo al buffer y se entrega al callback, para las mismas muestras
+    que los datos, en el lugar de los argumentos `METADATA()`. Con `records = True`, en cambio, cada elemento del buffer
+    es un registro estructurado (ver `record_dtype`) con los datos en el campo 'data' y la metadata en el resto de los
+    campos, de modo que cada muestra y su metadata ocupan un bloque contiguo de memoria; en ese caso `buffer_init` debe
+    describir el tipo y la forma de los datos (un ndarray de ejemplo o un tipo numérico; mientras sea `object`, la
+    metadata sigue en el array paralelo). Con `metadata_table = True`, además, la metadata de todas las muestras
+    guardadas se escribe en una tabla (`TableWriter`) en `table_path`, junto a los datos, con dos columnas extra: el
+    nombre del archivo en el que se guardó cada muestra (`file`) y su posición dentro de él (`item`).
+
+    El buffer es un `FanOutBuffer`, de modo que otros consumidores (visualización, streaming) pueden leer las mismas
+    muestras sin copias propias mediante `buffer.add_reader`; en modo 'latest', un lector nunca frena el guardado.
+
+    En modo serie, los paquetes se entregan al callback como vistas del buffer, sin copiarlos: el callback no debe
+    guardar referencias a los datos más allá de su ejecución (debe copiarlos si los necesita después).
+
+    Al detener el guardado (ya sea por la condición de parada o mediante `stop()`), las muestras que quedaron en el
+    buffer se guardan antes de emitir la señal `stopped`.
+
+    La tasa de entrada y la capacidad de guardado se miden continuamente (ver `SaveThroughput` y `backpressure_status`).
+    Cuando la carga supera `backpressure_threshold` y, en modo paralelo, el buffer y la cola se llenarían en menos de
+    `backpressure_horizon` segundos, se aplica la política `backpressure_policy` antes de perder datos:
+        'none': No realiza ninguna acción.
+        'warn': Levanta una advertencia (por defecto).
+        'decimate': Duplica `save_every`, de modo que se guarda una de cada dos muestras más que antes.
+        'degrade': Llama a `degrade()`, que las clases hijas implementan para abaratar el guardado (por ejemplo,
+                   cambiando a un códec más rápido). Si no es posible, decima.
+        'custom': Cuando se pasa una función, que recibe el SaveManager y el estado (`backpressure_status`).
+    En todos los casos se emite la señal `backpressure` con el estado. Luego de aplicar una política se espera
+    `backpressure_horizon` segundos antes de volver a evaluar.
+
+    Con `set_capture(pre_trigger, post_trigger)` el guardado pasa a modo de captura por eventos: las muestras se
+    mantienen en un anillo en memoria (`CaptureRing`) con las últimas `pre_trigger` muestras y no se guarda nada hasta
+    que se llama a `fire()` (directamente, o al emitirse una señal conectada con `connect_event`). En ese momento el
+    contenido del anillo entra al buffer, se guardan las `post_trigger` muestras siguientes y el guardado vuelve a
+    esperar el próximo evento. Las condiciones de parada siguen aplicándose a las muestras guardadas (COUNT) o al
+    tiempo total (TIME).
+
+    Si se define `rotate_bytes` (tamaño en bytes de los datos entregados al callback) o `rotate_time` (duración en
+    segundos), la grabación se divide en segmentos: todos los llamados a `callback` de un segmento reciben la misma ruta
+    (`segment_path`, con el número de segmento como sufijo) y al superarse alguno de los límites se pasa al siguiente
+    segmento y se emite `rotated`. Esto sólo tiene sentido con callbacks que acumulan las muestras en un único archivo
+    por ruta (como los modos hdf5, tiff y raw stream de `CameraSave`). La lista de segmentos, con sus rangos de muestras
+    y de tiempo, se mantiene en un manifiesto JSON (`RecordingManifest`) en `manifest_path`, que se actualiza al
+    comenzar cada segmento y al detener el guardado.
+
+    En modo paralelo, cada llamada a `callback` se encola (con los datos ya copiados fuera del buffer) en una cola
+    acotada de largo `queue_length` paquetes, que consumen `workers` hilos de escritura. Si la cola se llena, la
+    adquisición espera a que se libere lugar en lugar de descartar datos. Las señales `saved` se emiten desde el hilo
+    dueño del SaveManager apenas un hilo de escritura termina cada llamada (si ese hilo tiene un event loop de Qt; si
+    no, en la siguiente muestra que llega por el trigger), y `stop()` espera a que la cola se vacíe, de modo que
+    `stopped` sigue indicando que todos los datos fueron guardados. Con más de un hilo de escritura los callbacks pueden
+    ejecutarse fuera de orden, por lo que sólo debe usarse con callbacks que escriben archivos independientes. Las
+    clases hijas cuyo callback escribe sobre un estado compartido (por ejemplo, un único archivo abierto) deben devolver
+    True en `stateful_callback()`: en ese caso se usa un único hilo de escritura, cualquiera sea `workers`.
 
     Arguments
     =========
@@ -121,11 +316,34 @@ class SaveManager(QtCore.QObject):
     callback_args
     callback_kwargs
     callback_mode
+    queue_length
+    workers
+    backpressure_policy
+    backpressure_threshold
+    backpressure_horizon
+    metadata_table
+    records
+
+    pyQt Signals
+    ------------
+    backpressure(dict)
+        Cuando se aplica la política de backpressure, con el resultado de `backpressure_status()`.
+    fired(int)
+        Cuando ocurre un evento en modo de captura, con la cantidad de muestras previas al evento que se guardan.
+    captured(int)
+        Cuando termina de guardarse un evento en modo de captura, con el número de evento.
+    rotated(str)
+        Cuando la grabación pasa a un nuevo segmento, con la ruta del segmento nuevo.
     """
     added = QtCore.pyqtSignal(object, object)
+    _job_done = QtCore.pyqtSignal()
     saved = QtCore.pyqtSignal(object, object, object)
     started = QtCore.pyqtSignal()
     stopped = QtCore.pyqtSignal()
+    backpressure = QtCore.pyqtSignal(object)
+    fired = QtCore.pyqtSignal(int)
+    captured = QtCore.pyqtSignal(int)
+    rotated = QtCore.pyqtSignal(object)
     
     stop_condition_set = QtCore.pyqtSignal(object)
     limit_set = QtCore.pyqtSignal(object)
@@ -135,6 +353,9 @@ class SaveManager(QtCore.QObject):
     callback_kwargs_set = QtCore.pyqtSignal(object)
     
     BUFFER_OVERHEAD_IN_PACKETS = 5
+    BACKPRESSURE_CHECK_INTERVAL = 0.5
+    TABLE_EXTENSION = '.meta.npy'
+    MANIFEST_EXTENSION = '.manifest.json'
     
     def __init__(self,
                  callback,
@@ -157,7 +378,7 @@ class SaveManager(QtCore.QObject):
         self._save_every = 1
         self._single_file = None
         self._buffer_init = None
-        self._buffer = FIFOBuffer(init_object=self._buffer_init)
+        self._buffer = FanOutBuffer(init_object=self._buffer_init, mode='fifo')
         self._base_path = None
         self._folder = None
         self._base_name = None
@@ -167,6 +388,34 @@ class SaveManager(QtCore.QObject):
         self._callback_args = ()
         self._callback_kwargs = {}
         self._callback_mode = CallbackModes.SERIAL
+        self._jobs = None
+        self._workers = []
+        self._notify = False
+        self._completed = deque()
+        self._errors = deque()
+        self._metadata = None
+        self._records = False
+        self.metadata_dtype = None
+        self.metadata_getter = None
+        self.metadata_table = False
+        self.table = None
+        self.rotate_bytes = None
+        self.rotate_time = None
+        self.manifest = None
+        self.segment = 0
+        self.segment_path = None
+        self._segment_start = None
+        self.ring = None
+        self.post_trigger = 0
+        self.events = 0
+        self._post_remaining = None
+        self.metrics = None
+        self.throughput = SaveThroughput()
+        self.backpressure_policy = 'warn'
+        self.backpressure_threshold = 0.9
+        self.backpressure_horizon = 2.
+        self._backpressure_check = 0.
+        self._backpressure_hold = 0.
 
         self.buffer_init = buffer_init
         
@@ -178,6 +427,9 @@ class SaveManager(QtCore.QObject):
         
         self.stop_condition = stop_condition
         self.limit = limit
+        self.callback_mode = callback_mode
+        self.queue_length = self.BUFFER_OVERHEAD_IN_PACKETS
+        self.workers = 1
         self.packet_length = packet_length
         self.single_file = single_file
         self.save_every = 1
@@ -227,7 +479,8 @@ class SaveManager(QtCore.QObject):
             if value == False:
                 value = Numerations(0)
             else:
-                raise TypeError("Append value must be either a Numerations enum value, a string with a valid numeration name, an integer or a list with any of the above types.")
+                raise TypeError("Append value must be either a Numerations enum value, a string with a valid "
+                                "numeration name, an integer or a list with any of the above types.")
         elif isinstance(value, str):
             value = Numerations[value.upper()]
         elif isinstance(value, int):
@@ -246,10 +499,12 @@ class SaveManager(QtCore.QObject):
                 elif isinstance(v, Numerations):
                     append |= v
                 else:
-                    raise TypeError("Append value must be either a Numerations enum value, a string with a valid numeration name, an integer or a list with any of the above types.")
+                    raise TypeError("Append value must be either a Numerations enum value, a string with a valid "
+                                    "numeration name, an integer or a list with any of the above types.")
             value = append
         else:
-            raise TypeError("Append value must be either a Numerations enum value, a string with a valid numeration name, an integer or a list with any of the above types.")
+            raise TypeError("Append value must be either a Numerations enum value, a string with a valid "
+                            "numeration name, an integer or a list with any of the above types.")
         
         # To avoid file overwrite, lack of numeration is allowed only for single file operation
         if not value:
@@ -368,23 +623,28 @@ class SaveManager(QtCore.QObject):
         if isinstance(value, CallbackModes):
             pass
         elif isinstance(value, str):
-            value = CallbackModes[value]
+            value = CallbackModes[value.upper()]
         elif isinstance(value, int):
             value = CallbackModes(value)
         
-        if value == CallbackModes.PARALLEL:
-            raise NotImplementedError("Parallel callback mode in SaveManager is not yet implemented. Use serial mode instead.")
+        if self._jobs is not None:
+            raise RuntimeError("Callback mode cannot be changed while saving.")
         
-        self._callback_mode = value
+        if value != self._callback_mode:
+            self._callback_mode = value
+            # Resize buffer to the new mode
+            self.packet_length = self._packet_length
 
-    def insert_callback_args(self, data):
+    def insert_callback_args(self, data, metadata=None, path=None):
         callback_args = list(self.callback_args)
 
         for index, arg in enumerate(callback_args):
             if isinstance(arg, PATH):
-                callback_args[index] = self.path
+                callback_args[index] = self.path if path is None else path
             if isinstance(arg, DATA):
                 callback_args[index] = data
+            elif isinstance(arg, METADATA):
+                callback_args[index] = metadata
             #            elif isinstance(arg, TRIGGER_RETURN):
             #                callback_args[index] = trigger_returns[arg.index]
             elif isinstance(arg, INSTANCE_ATTRIBUTE):
@@ -392,14 +652,16 @@ class SaveManager(QtCore.QObject):
 
         return tuple(callback_args)
 
-    def insert_callback_kwargs(self, data):
+    def insert_callback_kwargs(self, data, metadata=None, path=None):
         callback_kwargs = dict(self.callback_kwargs)
 
         for index, (key, value) in enumerate(callback_kwargs.items()):
             if isinstance(value, PATH):
-                callback_kwargs[key] = self.path
+                callback_kwargs[key] = self.path if path is None else path
             if isinstance(value, DATA):
                 callback_kwargs[key] = data
+            elif isinstance(value, METADATA):
+                callback_kwargs[key] = metadata
             #            elif isinstance(value, TRIGGER_RETURN):
             #                callback_kwargs[key] = trigger_returns[value.index]
             elif isinstance(value, INSTANCE_ATTRIBUTE):
@@ -460,11 +722,11 @@ class SaveManager(QtCore.QObject):
         if self._callback_mode == CallbackModes.SERIAL:
             self._buffer.packet_length = value
             self._buffer.length = value
-            self._buffer.init_object = self.buffer_init
+            self._init_buffer()
         elif self._callback_mode == CallbackModes.PARALLEL:
             self._buffer.packet_length = value
             self._buffer.length = value * self.BUFFER_OVERHEAD_IN_PACKETS
-            self._buffer.init_object = self.buffer_init
+            self._init_buffer()
 
     @property
     def stop_flag(self):
@@ -484,7 +746,358 @@ class SaveManager(QtCore.QObject):
     @buffer_init.setter
     def buffer_init(self, value):
         self._buffer_init = value
-        self._buffer.init_object = value
+        self._init_buffer()
+
+    @property
+    def records(self):
+        return self._records
+
+    @records.setter
+    def records(self, value):
+        self._records = bool(value)
+        self._init_buffer()
+
+    @property
+    def stores_records(self):
+        """
+        True si la metadata se guarda dentro del buffer, en el mismo registro que los datos de cada muestra. Requiere
+        `records = True`, metadata registrada y un `buffer_init` numérico (con `object` se usa el array paralelo).
+        """
+        return self._records and self.metadata_dtype is not None and self._numeric_buffer_init()
+
+    def _numeric_buffer_init(self):
+        value = self.buffer_init
+        if value is None:
+            return False
+
+        try:
+            dtype = np.dtype(getattr(value, 'dtype', value))
+        except TypeError:
+            return False
+
+        return not dtype.hasobject
+
+    def _init_buffer(self):
+        if self.stores_records:
+            self._buffer.init_object = record_dtype(self.buffer_init, self.metadata_dtype)
+        else:
+            self._buffer.init_object = self.buffer_init
+
+    def _split_records(self, records):
+        # Data as a view of its field; metadata packed, since a multi-field index keeps the record layout
+        return records['data'], repack_fields(records[list(self.metadata_dtype.names)])
+
+    @property
+    def backpressure_policy(self):
+        return self._backpressure_policy.name.lower()
+
+    @backpressure_policy.setter
+    def backpressure_policy(self, value):
+        if isinstance(value, str):
+            self._backpressure_policy = BackpressurePolicies[value.upper()]
+            self.handle_backpressure = None
+        elif isinstance(value, BackpressurePolicies):
+            self._backpressure_policy = value
+            self.handle_backpressure = None
+        elif isinstance(value, (FunctionType, BuiltinFunctionType, MethodType)):
+            self._backpressure_policy = BackpressurePolicies.CUSTOM
+            self.handle_backpressure = value
+        else:
+            raise TypeError("Backpressure policy must be a string with a valid policy or a function. "
+                            "See 'BackpressurePolicies'.")
+
+    def backpressure_status(self):
+        """
+        Devuelve un diccionario con la tasa de entrada (muestras/s), la capacidad de guardado (muestras/s y MB/s), la
+        carga, las muestras pendientes, la capacidad del buffer (más la cola de escritura en modo paralelo) y el tiempo
+        estimado hasta un overrun en segundos (infinito si el guardado sigue el ritmo de la entrada).
+        """
+        workers = len(self._workers) if self._workers else 1
+        load = self.throughput.load(workers)
+        pending = self.pending
+        capacity = self.buffer.length
+        if self._jobs is not None:
+            capacity += self._jobs.maxsize * (1 if self.single_file else self._packet_length)
+
+        net_rate = self.throughput.input_rate - self.throughput.save_rate * workers
+        if self._jobs is None:
+            # Serial saving blocks the trigger thread: once overloaded, samples are lost upstream right away
+            time_to_overrun = 0. if load > 1 else float('inf')
+        elif net_rate > 0 and self.throughput.save_rate:
+            time_to_overrun = max(capacity - pending, 0) / net_rate
+        else:
+            time_to_overrun = float('inf')
+
+        return {'input_rate': self.throughput.input_rate,
+                'save_rate': self.throughput.save_rate * workers,
+                'write_MBps': self.throughput.write_rate * workers,
+                'load': load,
+                'pending': pending,
+                'capacity': capacity,
+                'time_to_overrun': time_to_overrun,
+                'save_every': self.save_every}
+
+    def check_backpressure(self, now=None):
+        if now is None:
+            now = perf_counter()
+
+        if now - self._backpressure_check < self.BACKPRESSURE_CHECK_INTERVAL or now < self._backpressure_hold:
+            return None
+        self._backpressure_check = now
+
+        if self._backpressure_policy == BackpressurePolicies.NONE:
+            return None
+
+        status = self.backpressure_status()
+        if status['load'] <= self.backpressure_threshold or status['time_to_overrun'] > self.backpressure_horizon:
+            return None
+
+        self.apply_backpressure(status)
+        self._backpressure_hold = now + self.backpressure_horizon
+        self.backpressure.emit(status)
+
+        return status
+
+    def apply_backpressure(self, status):
+        policy = self._backpressure_policy
+
+        if policy == BackpressurePolicies.WARN:
+            warn("Saving at {:.1f} samples/s cannot keep up with {:.1f} samples/s input (overrun in {:.1f} s).".format(
+                status['save_rate'], status['input_rate'], status['time_to_overrun']))
+        elif policy == BackpressurePolicies.DEGRADE and self.degrade():
+            pass
+        elif policy in (BackpressurePolicies.DECIMATE, BackpressurePolicies.DEGRADE):
+            self.save_every = 2 * self.save_every
+            warn("Saving cannot keep up with input, saving one of every {} samples from now on.".format(
+                self.save_every))
+        elif policy == BackpressurePolicies.CUSTOM:
+            self.handle_backpressure(self, status)
+
+    def degrade(self):
+        """
+        Abarata el guardado para la política de backpressure 'degrade'. Devuelve True si pudo hacerlo. Por defecto, no
+        hace nada; las clases hijas pueden reimplementarlo.
+        """
+        return False
+
+    def set_capture(self, pre_trigger, post_trigger=0):
+        """
+        Activa el modo de captura por eventos, guardando las `pre_trigger` muestras previas y las `post_trigger`
+        muestras posteriores a cada evento. Con `pre_trigger=None` vuelve al guardado continuo.
+        """
+        if self.enabled:
+            raise RuntimeError("Capture mode cannot be changed while saving.")
+
+        if pre_trigger is None:
+            self.ring = None
+            self.post_trigger = 0
+        else:
+            self.ring = CaptureRing(int(pre_trigger), self.metadata_dtype)
+            self.post_trigger = int(post_trigger)
+
+    @property
+    def capturing(self):
+        """True si, en modo de captura, se están guardando las muestras posteriores a un evento."""
+        return self._post_remaining is not None
+
+    def fire(self, *args):
+        if not self.enabled or self.ring is None or self.capturing:
+            return None
+
+        data, metadata = self.ring.drain()
+        self.fired.emit(len(data))
+
+        self._post_remaining = self.post_trigger
+        for index, value in enumerate(data):
+            self.add(value, None if metadata is None else metadata[index])
+
+        if self._post_remaining == 0:
+            self.end_capture()
+
+        if self.stop_flag:
+            self.stop()
+
+    def connect_event(self, signal, condition=None):
+        """
+        Conecta la señal `signal` como fuente de eventos del modo de captura. Si se da `condition`, se llama con los
+        mismos argumentos que la señal y el evento sólo ocurre cuando devuelve True (por ejemplo, un umbral sobre un
+        espectro: `lambda spectrum: spectrum.y.max() > threshold`). Devuelve el slot conectado.
+        """
+        if condition is None:
+            slot = self.fire
+        else:
+            def slot(*args):
+                if condition(*args):
+                    self.fire()
+
+        signal.connect(slot)
+
+        return slot
+
+    def end_capture(self):
+        self._post_remaining = None
+        self.save(self.buffer.write_counter - self.buffer.read_counter)
+
+        self.events += 1
+        self.captured.emit(self.events)
+
+    def add(self, value, record=None):
+        if self.stores_records:
+            self.buffer((value, ) + tuple(record))
+            self.added.emit(self.buffer.write_counter, self.run_time)
+            return None
+
+        if record is not None:
+            self._store_metadata(record)
+
+        self.buffer(value)
+        self.added.emit(self.buffer.write_counter, self.run_time)
+
+    def set_metadata(self, dtype, getter):
+        """
+        Registra metadata por muestra. `getter` se llama con los mismos argumentos que el trigger cada vez que una
+        muestra entra al buffer y debe devolver una tupla compatible con el tipo estructurado `dtype`.
+        """
+        self.metadata_dtype = None if dtype is None else np.dtype(dtype)
+        self.metadata_getter = getter
+        self._metadata = None
+
+        if self._records:
+            self._init_buffer()
+
+        if self.ring is not None:
+            self.ring = CaptureRing(self.ring.length, self.metadata_dtype)
+
+    def needs_metadata(self):
+        """
+        True si la metadata de cada muestra se usa: para la tabla de metadata, los registros del buffer, el anillo de
+        pre-trigger o el `callback` (ver `callback_uses_metadata`).
+        """
+        return self.metadata_table or self.stores_records or self.ring is not None or self.callback_uses_metadata()
+
+    def callback_uses_metadata(self):
+        """
+        True si `callback` recibe la metadata, es decir, si `METADATA()` está entre sus argumentos. Las subclases con
+        varios modos de guardado lo redefinen según el modo.
+        """
+        arguments = list(self.callback_args) + list(self.callback_kwargs.values())
+
+        return any(isinstance(arg, METADATA) for arg in arguments)
+
+    def _store_metadata(self, record):
+        # Stored before the sample is written, since a full packet is saved from within the buffer write
+        if self._metadata is None or len(self._metadata) != self.buffer.length:
+            self._metadata = np.zeros(self.buffer.length, dtype=self.metadata_dtype)
+
+        # On overrun the sample is not written and the next slot still holds unread metadata
+        if self.buffer.write_counter - self.buffer.read_counter < self.buffer.length:
+            self._metadata[(self.buffer.write_index + 1) % self.buffer.length] = record
+
+    @property
+    def recording_name(self):
+        """Nombre común a los archivos de una grabación (tabla de metadata, manifiesto y segmentos)."""
+        name = self._base_name
+        if self.append & Numerations.TIMESTAMP:
+            name += "_" + self.start_time.strftime("%Y%m%d_%H%M%S")
+
+        return name
+
+    @property
+    def table_path(self):
+        return str(Path(self._folder) / (self.recording_name + self.TABLE_EXTENSION))
+
+    @property
+    def manifest_path(self):
+        return str(Path(self._folder) / (self.recording_name + self.MANIFEST_EXTENSION))
+
+    @property
+    def segmented(self):
+        return self.rotate_bytes is not None or self.rotate_time is not None
+
+    def begin_segment(self):
+        name = "{}_{:04d}{}".format(self.recording_name, self.segment, self._extension)
+        self.segment_path = str(Path(self._folder) / name)
+        self._segment_start = perf_counter()
+
+        first_item = self.manifest.items if len(self.manifest) else 0
+        self.manifest.begin_segment(self.segment_path, first_item)
+        self.manifest.save()
+
+    def rotate(self):
+        self.segment += 1
+        self.begin_segment()
+        self.rotated.emit(self.segment_path)
+
+    def _check_rotation(self, nbytes):
+        current = self.manifest.segments[-1]
+        if not current['items']:
+            return None
+
+        rotate_time = self.rotate_time
+        if rotate_time is not None and not isinstance(rotate_time, (int, float)):
+            rotate_time = rotate_time.to('s').magnitude
+
+        bytes_flag = self.rotate_bytes is not None and current['bytes'] + nbytes > self.rotate_bytes
+        time_flag = rotate_time is not None and perf_counter() - self._segment_start >= rotate_time
+        if bytes_flag or time_flag:
+            self.rotate()
+
+    def _update_manifest(self, items, nbytes, metadata):
+        names = () if metadata is None else metadata.dtype.names
+        if 'timestamp' in names:
+            timestamps = np.reshape(metadata, -1)['timestamp']
+            start, end = timestamps.min(), timestamps.max()
+        else:
+            start = end = time()
+
+        self.manifest.update(items, nbytes, start, end)
+
+    def open_table(self):
+        self.close_table()
+
+        # Room for the base name plus the timestamp and count suffixes
+        file_length = len(Path(self.path).name.encode()) + 16
+        fields = [(name, self.metadata_dtype.fields[name][0]) for name in self.metadata_dtype.names]
+        self.table = TableWriter(self.table_path, fields + [('file', 'S{}'.format(file_length)), ('item', '<u4')])
+
+    def close_table(self):
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def _append_table(self, path, metadata):
+        metadata = np.reshape(metadata, -1)
+        rows = np.zeros(len(metadata), dtype=self.table.dtype)
+        for name in self.metadata_dtype.names:
+            rows[name] = metadata[name]
+        rows['file'] = Path(path).name.encode()
+        rows['item'] = np.arange(len(rows))
+
+        self.table.append(rows)
+
+    def _read_metadata(self, data_length):
+        # Must be called before reading the buffer, since it uses the current read index
+        if self._metadata is None or self.stores_records:
+            return None
+
+        metadata = self._metadata[self.buffer.oldest_indices(data_length)]
+
+        # A single sample is read as the element itself, not as a one-element array
+        return metadata[0] if data_length == 1 else metadata
+
+    def set_monitor(self, monitor, name='save'):
+        """
+        Registra el guardado como una etapa del `PipelineMonitor` dado, bajo el nombre `name`. Se miden los tiempos de
+        cada llamada a `callback`, la cantidad de muestras en espera en el buffer y los overruns del buffer.
+        """
+        if self.metrics is not None:
+            self._buffer.overrun.disconnect(self._count_overrun)
+
+        self.metrics = monitor.stage(name)
+        self._buffer.overrun.connect(self._count_overrun)
+
+    def _count_overrun(self):
+        self.metrics.drop()
 
     def add_to_buffer(self, *trigger_returns):
         self.buffer(trigger_returns[self.index_of_data])
@@ -497,15 +1110,47 @@ class SaveManager(QtCore.QObject):
         self.start_time = datetime.now()
         self.stop_time = None
         self.enabled = True
+        self.throughput.reset()
+        self._backpressure_hold = 0.
+
+        if self.metadata_table and self.metadata_dtype is not None:
+            self.open_table()
+
+        self.manifest = None
+        if self.segmented:
+            self.segment = 0
+            self.manifest = RecordingManifest(self.manifest_path)
+            self.begin_segment()
+
+        self.events = 0
+        self._post_remaining = None
+        if self.ring is not None:
+            self.ring.clear()
         
         self.buffer.packet_filled.connect(self.save)
         self.trigger.connect(self.run)
+        
+        if self._callback_mode == CallbackModes.PARALLEL:
+            self.start_workers()
+        
         self.started.emit()
     
     def stop(self):
         self.enabled = False
         self.trigger.disconnect(self.run)
         self.buffer.packet_filled.disconnect(self.save)
+        
+        try:
+            # Save remaining data
+            remaining_length = self.buffer.write_counter - self.buffer.read_counter
+            self.save(remaining_length)
+        finally:
+            if self._jobs is not None:
+                self.stop_workers()
+            self.close_table()
+            if self.manifest is not None:
+                self.manifest.save()
+        
         self.stopped.emit()
         
         self.stop_time = datetime.now()
@@ -515,45 +1160,192 @@ class SaveManager(QtCore.QObject):
             self.trigger_count += 1
             self.update_run_time()
             
+            if self._completed or self._errors:
+                self.emit_completed()
+            
             if self.trigger_count % self.save_every == 0:
-                self.buffer(trigger_returns[self.index_of_data])
-                self.added.emit(self.buffer.write_counter, self.run_time)
+                record = None
+                if self.metadata_getter is not None and self.needs_metadata():
+                    record = self.metadata_getter(*trigger_returns)
+                
+                if self.ring is not None and not self.capturing:
+                    self.ring.push(trigger_returns[self.index_of_data], record)
+                else:
+                    self.throughput.added()
+                    self.add(trigger_returns[self.index_of_data], record)
+                    self.check_backpressure()
+                    
+                    if self.capturing:
+                        self._post_remaining -= 1
+                        if self._post_remaining <= 0:
+                            self.end_capture()
+                
+                if self.metrics is not None:
+                    self.metrics.set_queue_depth(self.pending)
             
             # Check for stop condition
             if self.stop_flag:
                 self.stop()
-                
-                # Save remaining data
-                remaining_length = self.buffer.write_counter - self.buffer.read_counter
-                self.save(remaining_length)
 
     def save(self, data_length=None):
         if isinstance(data_length, type(None)):
-            data_length = self._packet_length
+            # A partial save (at the end of a capture) leaves fewer samples than a packet for the next one
+            data_length = min(self._packet_length, self.buffer.write_counter - self.buffer.read_counter)
         
         if data_length != 0:
-            data_array = self.buffer.read(data_length)
+            metadata_array = self._read_metadata(data_length)
+            if data_length == 1 or self._jobs is not None:
+                data_array = self.buffer.read(data_length)
+            else:
+                # Serial callbacks finish before the buffer is written again, so they can save straight from it
+                data_array = self.buffer.read_view(data_length)
 
-            if self.single_file and isinstance(data_array, np.ndarray):
-                for data in data_array:
-                    callback_args = self.insert_callback_args(data)
-                    callback_kwargs = self.insert_callback_kwargs(data)
-                    self.callback(*callback_args, **callback_kwargs)
+            if self.stores_records:
+                data_array, metadata_array = self._split_records(data_array)
 
-                    self.saved.emit(self.path, self.count, self.run_time)
-                    self.count += 1
-                    self.update_run_time()
+            # A single sample is read as the element itself, a view of a buffer slot that later samples overwrite
+            if data_length == 1 and self._jobs is not None and isinstance(data_array, np.ndarray):
+                data_array = data_array.copy()
+
+            if self.single_file and data_length > 1 and isinstance(data_array, np.ndarray):
+                for index, data in enumerate(data_array):
+                    metadata = None if metadata_array is None else metadata_array[index]
+                    self.dispatch(data, metadata)
             else:
-                callback_args = self.insert_callback_args(data_array)
-                callback_kwargs = self.insert_callback_kwargs(data_array)
-                self.callback(*callback_args, **callback_kwargs)
+                self.dispatch(data_array, metadata_array, data_length)
 
-                self.saved.emit(self.path, self.count, self.run_time)
-                self.count += 1
-                self.update_run_time()
+            if self.metrics is not None:
+                self.metrics.set_queue_depth(self.pending)
 
         self.count = 0
-    
+
+    def dispatch(self, data, metadata=None, items=1):
+        nbytes = getattr(data, 'nbytes', 0)
+
+        if self.manifest is not None and self.segmented:
+            self._check_rotation(nbytes)
+            self._update_manifest(items, nbytes, metadata)
+            path = self.segment_path
+        else:
+            path = self.path
+
+        callback_args = self.insert_callback_args(data, metadata, path)
+        callback_kwargs = self.insert_callback_kwargs(data, metadata, path)
+        count = self.count
+        self.count += 1
+
+        if self.table is not None and metadata is not None:
+            self._append_table(path, metadata)
+
+        if self._jobs is not None:
+            # Blocks while the queue is full, so acquisition waits instead of losing data
+            self._jobs.put((path, count, items, nbytes, callback_args, callback_kwargs))
+        else:
+            start, end = self.execute(callback_args, callback_kwargs)
+            self.record_save(items, nbytes, start, end, blocking=True)
+            self.saved.emit(path, count, self.run_time)
+            self.update_run_time()
+
+    def execute(self, callback_args, callback_kwargs):
+        start = perf_counter()
+        self.callback(*callback_args, **callback_kwargs)
+
+        return start, perf_counter()
+
+    def record_save(self, items, nbytes, start, end, blocking=False):
+        # Called from the owner thread only, since the metrics and the throughput monitor are not thread safe
+        self.throughput.saved(items, end - start, nbytes, blocking=blocking)
+        if self.metrics is not None:
+            self.metrics.end(start, items=items, now=end)
+
+    @property
+    def pending(self):
+        """
+        Cantidad de muestras en el buffer más paquetes en la cola de escritura (modo paralelo) que aún no se guardaron.
+        """
+        pending = self.buffer.write_counter - self.buffer.read_counter
+        if self._jobs is not None:
+            pending += self._jobs.qsize()
+
+        return pending
+
+    def stateful_callback(self):
+        """
+        True si las llamadas a `callback` comparten estado (como un archivo abierto) y no pueden ejecutarse en paralelo
+        ni fuera de orden.
+        """
+        return False
+
+    def start_workers(self):
+        queue_length = self.queue_length * (self._packet_length if self.single_file else 1)
+        self._jobs = Queue(maxsize=max(queue_length, 1))
+        self._completed.clear()
+        self._errors.clear()
+
+        workers = max(int(self.workers), 1)
+        if workers > 1 and self.stateful_callback():
+            warn("The save callback writes to shared state: using a single writer thread instead of {}.".format(
+                workers))
+            workers = 1
+
+        # Without an event loop (headless) the queued signal would never be delivered
+        self._notify = QtCore.QCoreApplication.instance() is not None
+        if self._notify:
+            self._job_done.connect(self.emit_saved, QtCore.Qt.QueuedConnection)
+
+        self._workers = [Thread(target=self._work, name='save-worker-{}'.format(idx), daemon=True)
+                         for idx in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def stop_workers(self):
+        for worker in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+
+        self._workers = []
+        self._jobs = None
+        if self._notify:
+            self._job_done.disconnect(self.emit_saved)
+            self._notify = False
+        self.emit_completed()
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+
+            path, count, items, nbytes, callback_args, callback_kwargs = job
+            try:
+                start, end = self.execute(callback_args, callback_kwargs)
+            except Exception as error:
+                self._errors.append(error)
+            else:
+                self._completed.append((path, count, items, nbytes, start, end))
+                if self._notify:
+                    self._job_done.emit()
+
+    def emit_completed(self):
+        """
+        Emite, desde el hilo que llama a este método, las señales `saved` de los guardados completados por los hilos de
+        escritura y registra sus tiempos en las métricas. Si alguno falló, levanta la excepción correspondiente.
+        """
+        self.emit_saved()
+
+        if self._errors:
+            error = self._errors.popleft()
+            self._errors.clear()
+            raise error
+
+    def emit_saved(self):
+        while self._completed:
+            path, count, items, nbytes, start, end = self._completed.popleft()
+            self.record_save(items, nbytes, start, end)
+            self.update_run_time()
+            self.saved.emit(path, count, self.run_time)
+
     def update_run_time(self):
         if self.start_time:
             self.run_time = (datetime.now() - self.start_time).total_seconds() * ureg.s
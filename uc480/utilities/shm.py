@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 12:20:51 2026
+
+@author: Axel Lacapmesure
+"""
+
+import numpy as np
+
+from multiprocessing import shared_memory
+
+from collections import namedtuple
+
+from struct import Struct
+
+from time import time, sleep, monotonic
+
+import os
+
+
+class SharedFrameError(Exception):
+    """
+        Excepción cuando el anillo de memoria compartida no es válido o un cuadro fue sobrescrito durante su lectura.
+    """
+    pass
+
+
+FrameInfo = namedtuple('FrameInfo', 'sequence timestamp exposure shape dtype slot lock')
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        # Windows frees a segment with its last handle, so an existing one always has a live owner
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class _SharedFrameRing:
+    """
+    Estructura común del anillo de cuadros en memoria compartida.
+
+    El segmento comienza con un encabezado global seguido de `slots` posiciones de tamaño fijo. Cada posición tiene un
+    encabezado propio (con la metadata del cuadro) y a continuación los datos crudos del cuadro, alineados a 64 bytes.
+
+    Encabezado global (`HEADER`)::
+
+        magic (8s), version (I), slots (I), slot_capacity (Q), pid (Q), published (Q)
+
+    donde `pid` es el proceso del publicador y `published` es la cantidad total de cuadros publicados (el último cuadro
+    tiene número de secuencia `published - 1`).
+
+    Encabezado de cada posición (`SLOT_HEADER`)::
+
+        lock (Q), sequence (Q), timestamp (d), exposure (d), nbytes (Q), dtype (8s), ndim (I), shape (4I)
+
+    El campo `lock` implementa un seqlock: es impar mientras el escritor modifica la posición y par cuando el cuadro
+    está completo. Un lector válido debe observar el mismo valor par antes y después de usar los datos.
+    """
+
+    MAGIC = b'UC480SHM'
+    VERSION = 2
+    ALIGNMENT = 64
+    MAX_DIMS = 4
+
+    HEADER = Struct('<8sIIQQQ')
+    SLOT_HEADER = Struct('<QQddQ8sI4I')
+
+    PUBLISHED_OFFSET = HEADER.size - 8
+
+    @classmethod
+    def _aligned(cls, size):
+        return -(-size // cls.ALIGNMENT) * cls.ALIGNMENT
+
+    @classmethod
+    def header_size(cls):
+        return cls._aligned(cls.HEADER.size)
+
+    @classmethod
+    def slot_header_size(cls):
+        return cls._aligned(cls.SLOT_HEADER.size)
+
+    @classmethod
+    def slot_size(cls, slot_capacity):
+        return cls.slot_header_size() + cls._aligned(slot_capacity)
+
+    @classmethod
+    def total_size(cls, slots, slot_capacity):
+        return cls.header_size() + slots * cls.slot_size(slot_capacity)
+
+    @staticmethod
+    def _attach(name):
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers attached segments too, and would unlink them on exit
+            shm = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix':
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            return shm
+
+    def _slot_offset(self, slot):
+        return self.header_size() + slot * self.slot_size(self.slot_capacity)
+
+    @property
+    def published(self):
+        return int(self._published[0])
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _read_slot_header(self, slot):
+        values = self.SLOT_HEADER.unpack_from(self.shm.buf, self._slot_offset(slot))
+        lock, sequence, timestamp, exposure, nbytes, dtype, ndim = values[0:7]
+        shape = tuple(values[7:7 + ndim])
+
+        return lock, FrameInfo(sequence, timestamp, exposure, shape, dtype.rstrip(b'\0').decode(), slot, lock)
+
+    def _lock(self, slot):
+        return self._locks[slot * self._lock_stride]
+
+
+class SharedFrameWriter(_SharedFrameRing):
+    """
+    Publicador de cuadros en un anillo de memoria compartida (`multiprocessing.shared_memory`).
+
+    Cada cuadro escrito se copia en la siguiente posición del anillo junto con su metadata. Procesos externos pueden
+    conectarse con `SharedFrameReader` y leer los cuadros sin copias y sin competir por el GIL del proceso de
+    adquisición.
+
+    Parameters
+    ----------
+    name : str
+        Nombre del segmento de memoria compartida.
+    slots : int
+        Cantidad de cuadros que se conservan en el anillo (por defecto: 8).
+    slot_capacity : int
+        Tamaño máximo en bytes de un cuadro. Cuadros más grandes levantan `ValueError`.
+
+    Notes
+    -----
+    El escritor es el dueño del segmento: `close()` lo libera y lo elimina del sistema. Los lectores conectados
+    conservan su mapeo hasta cerrarlo, pero no verán nuevos cuadros.
+
+    Si ya existe un segmento con el mismo nombre, sólo se reemplaza cuando es un anillo de esta versión cuyo
+    publicador terminó sin liberarlo. Si su publicador sigue vivo, o si no es un anillo de uc480, se levanta
+    `SharedFrameError`.
+    """
+
+    def __init__(self, name, slot_capacity, slots=8):
+        self.slots = int(slots)
+        self.slot_capacity = int(slot_capacity)
+
+        if self.slots < 1:
+            raise ValueError("Shared frame ring needs at least one slot.")
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=self.total_size(self.slots, self.slot_capacity))
+        except FileExistsError:
+            self._remove_stale(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=self.total_size(self.slots, self.slot_capacity))
+
+        self.HEADER.pack_into(self.shm.buf, 0, self.MAGIC, self.VERSION, self.slots, self.slot_capacity, os.getpid(),
+                              0)
+        self._published = np.ndarray((1,), dtype='<u8', buffer=self.shm.buf, offset=self.PUBLISHED_OFFSET)
+        self._locks = np.ndarray((self.slots * self.slot_size(self.slot_capacity) // 8,), dtype='<u8',
+                                 buffer=self.shm.buf, offset=self.header_size())
+        self._lock_stride = self.slot_size(self.slot_capacity) // 8
+        self._sequence = 0
+
+    @classmethod
+    def _remove_stale(cls, name):
+        existing = cls._attach(name)
+        try:
+            if existing.size < cls.HEADER.size:
+                raise SharedFrameError("Shared memory segment '{}' exists and is not a uc480 frame ring.".format(name))
+
+            magic, version, _, _, pid, _ = cls.HEADER.unpack_from(existing.buf, 0)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise SharedFrameError("Shared memory segment '{}' exists and is not a uc480 frame ring of version "
+                                       "{}.".format(name, cls.VERSION))
+            if _process_alive(pid):
+                raise SharedFrameError("Shared memory segment '{}' is in use by publisher process {}.".format(
+                    name, pid))
+
+            # Left by a publisher that crashed: take it over. unlink() unregisters the segment from the resource
+            # tracker, which _attach already did on Python < 3.13
+            if os.name == 'posix' and getattr(existing, '_track', True):
+                from multiprocessing import resource_tracker
+                resource_tracker.register(existing._name, 'shared_memory')
+            existing.unlink()
+        finally:
+            existing.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, frame, timestamp=None, exposure=float('nan')):
+        frame = np.ascontiguousarray(frame)
+
+        if frame.nbytes > self.slot_capacity:
+            raise ValueError("Frame of {} bytes exceeds shared memory slot capacity of {} bytes.".format(
+                frame.nbytes, self.slot_capacity))
+        if frame.ndim > self.MAX_DIMS:
+            raise ValueError("Frames with more than {} dimensions are not supported.".format(self.MAX_DIMS))
+
+        if timestamp is None:
+            timestamp = time()
+
+        sequence = self._sequence
+        slot = sequence % self.slots
+        offset = self._slot_offset(slot)
+        index = slot * self._lock_stride
+
+        # Seqlock: odd while writing, even (and unique per sequence) when done
+        self._locks[index] = 2 * sequence + 1
+
+        shape = tuple(frame.shape) + (0,) * (self.MAX_DIMS - frame.ndim)
+        self.SLOT_HEADER.pack_into(self.shm.buf, offset, 2 * sequence + 1, sequence, timestamp, exposure,
+                                   frame.nbytes, frame.dtype.str.encode(), frame.ndim, *shape)
+        data = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf, offset=offset + self.slot_header_size())
+        np.copyto(data, frame)
+
+        self._locks[index] = 2 * sequence + 2
+        self._published[0] = sequence + 1
+        self._sequence += 1
+
+        return sequence
+
+    def close(self):
+        if self.shm is None:
+            return None
+
+        self._published = None
+        self._locks = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class SharedFrameReader(_SharedFrameRing):
+    """
+    Lector de cuadros publicados por `SharedFrameWriter` desde otro proceso.
+
+    Los métodos de lectura devuelven un par `(frame, info)`, donde `frame` es un ndarray de sólo lectura que apunta
+    directamente a la memoria compartida (sin copias) e `info` es un `FrameInfo` con la metadata del cuadro.
+
+    Parameters
+    ----------
+    name : str
+        Nombre del segmento de memoria compartida creado por el publicador.
+
+    Notes
+    -----
+    Como los datos no se copian, el escritor puede sobrescribir la posición mientras el lector la usa (si el lector se
+    atrasa más de `slots` cuadros). Luego de procesar un cuadro, `is_valid(info)` indica si los datos leídos siguen
+    siendo los del cuadro `info.sequence`. Si se necesita conservar el cuadro, basta con copiarlo y verificar
+    `is_valid` una única vez después de la copia. Antes de `close()` deben liberarse las referencias a los cuadros
+    leídos.
+
+    Ejemplo::
+
+        with SharedFrameReader('uc480_frames') as reader:
+            frame, info = reader.wait_next(timeout=1)
+            value = frame.mean()
+            if reader.is_valid(info):
+                print(info.sequence, value)
+    """
+
+    def __init__(self, name):
+        self.shm = self._attach(name)
+
+        magic, version, slots, slot_capacity, _, _ = self.HEADER.unpack_from(self.shm.buf, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.shm.close()
+            raise SharedFrameError("Shared memory segment '{}' is not a uc480 frame ring.".format(name))
+
+        self.slots = slots
+        self.slot_capacity = slot_capacity
+        self._published = np.ndarray((1,), dtype='<u8', buffer=self.shm.buf, offset=self.PUBLISHED_OFFSET)
+        self._locks = np.ndarray((self.slots * self.slot_size(self.slot_capacity) // 8,), dtype='<u8',
+                                 buffer=self.shm.buf, offset=self.header_size())
+        self._lock_stride = self.slot_size(self.slot_capacity) // 8
+        self.next_sequence = self.published
+        self.missed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def read(self, sequence):
+        if sequence >= self.published:
+            raise SharedFrameError("Frame {} has not been published yet.".format(sequence))
+
+        slot = sequence % self.slots
+        lock, info = self._read_slot_header(slot)
+
+        if lock % 2 or info.sequence != sequence or self._lock(slot) != lock:
+            raise SharedFrameError("Frame {} was overwritten.".format(sequence))
+
+        offset = self._slot_offset(slot) + self.slot_header_size()
+        frame = np.ndarray(info.shape, dtype=np.dtype(info.dtype), buffer=self.shm.buf, offset=offset)
+        frame.flags.writeable = False
+
+        return frame, info
+
+    def latest(self):
+        published = self.published
+        if published == 0:
+            return None, None
+
+        # Retry if the newest frame is being replaced while we look at it
+        for sequence in range(published - 1, max(published - 1 - self.slots, -1), -1):
+            try:
+                return self.read(sequence)
+            except SharedFrameError:
+                continue
+
+        return None, None
+
+    def read_next(self):
+        """
+        Devuelve el siguiente cuadro no leído, o `(None, None)` si no hay cuadros nuevos. Los cuadros sobrescritos antes
+        de ser leídos se suman al contador `missed`.
+        """
+        published = self.published
+
+        if self.next_sequence >= published:
+            return None, None
+
+        oldest = max(published - self.slots, 0)
+        if self.next_sequence < oldest:
+            self.missed += oldest - self.next_sequence
+            self.next_sequence = oldest
+
+        while self.next_sequence < self.published:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            try:
+                return self.read(sequence)
+            except SharedFrameError:
+                self.missed += 1
+
+        return None, None
+
+    def wait_next(self, timeout=None, poll_interval=1e-3):
+        deadline = None if timeout is None else monotonic() + timeout
+
+        while True:
+            frame, info = self.read_next()
+            if frame is not None:
+                return frame, info
+            if deadline is not None and monotonic() >= deadline:
+                return None, None
+            sleep(poll_interval)
+
+    def is_valid(self, info):
+        return self._lock(info.slot) == info.lock
+
+    def close(self):
+        if self.shm is None:
+            return None
+
+        self._published = None
+        self._locks = None
+        self.shm.close()
+        self.shm = None
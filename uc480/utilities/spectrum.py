@@ -8,6 +8,7 @@ Created on Mon Feb 25 12:55:59 2019
 from .func import file_dialog_open
 
 from .buffer import BufferCore
+from .writers import write_text
 
 from lantz.qt import QtCore
 
@@ -67,12 +68,15 @@ class Spectrum(QtCore.QObject):
         
         def __getitem__(self, value):
             # Get indices ordered from first to last, then slice as indicated by value and reorder to mantain old-first order
-            indices = np.flip(self.buffer.indices_new_first[value])
+            indices = self.buffer.indices_new_first[value]
+            if isinstance(indices, np.ndarray):
+                # Reversed as a view of the cached ordering, without allocating a new index array
+                indices = indices[::-1]
             
             x = self.x
             y = self.y[indices, :]
             
-            spectrum = self.__class__(x=x, y=y, buffer_size=indices.size)
+            spectrum = self.__class__(x=x, y=y, buffer_size=np.size(indices))
             spectrum.buffer.index = 0
             spectrum.buffer.count = self.buffer.count
             
@@ -131,7 +135,7 @@ class Spectrum(QtCore.QObject):
             
             # If shrinking, retain the latest elements from buffer
             if new_size < old_size:
-                indices = np.flip(self.buffer.indices_new_first[0:new_size])
+                indices = self.buffer.indices_old_first[old_size-new_size:]
                 self._y = self.y[indices, :]
                 
                 self.buffer.length = new_size
@@ -511,7 +515,7 @@ class Spectrum(QtCore.QObject):
         
         output = output.transpose()
         
-        np.savetxt(path, output, fmt=fmt, delimiter=SEP, newline=NL, header=header)
+        write_text(path, output, fmt=fmt, delimiter=SEP, newline=NL, header=header)
     
     @classmethod
     def from_file(cls, path=None):
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:48:03 2026
+
+@author: Axel Lacapmesure
+"""
+
+import numpy as np
+
+from collections import namedtuple
+
+from time import perf_counter
+
+
+FrameStats = namedtuple('FrameStats', 'mean min max saturated saturated_fraction histogram edges count')
+
+
+class FrameStatistics:
+    """
+    Estadística en vivo de los cuadros de la cámara: media, mínimo, máximo, cantidad de píxeles saturados e histograma.
+
+    Para que el costo sea independiente del tamaño del cuadro, las cuentas se hacen sobre una submuestra del cuadro
+    tomando uno de cada `stride` píxeles en cada dirección (una vista, sin copias). El histograma tiene `bins` bins
+    uniformes entre 0 y el nivel de saturación; sus bordes se calculan una única vez (al cambiar `bins` o `bit_depth`)
+    y los contadores se obtienen en cada actualización con `np.bincount`, que devuelve un arreglo nuevo.
+
+    Parameters
+    ----------
+    bit_depth : int, opcional
+        Profundidad de bits de la cámara. Define el nivel de saturación `2**bit_depth - 1` (por defecto: 8).
+    stride : int, opcional
+        Paso de la submuestra en cada eje (por defecto: 4).
+    bins : int, opcional
+        Cantidad de bins del histograma (por defecto: 64).
+
+    Notes
+    -----
+    Un píxel se cuenta como saturado cuando su valor es mayor o igual al nivel de saturación. Si la cámara corrige el
+    dark o promedia cuadros, los valores pasan a ser flotantes: la saturación se evalúa igual, sobre el valor final.
+    """
+
+    def __init__(self, bit_depth=8, stride=4, bins=64):
+        # Both setters reset the histogram, so each one needs the other value in place
+        self.stride = stride
+        self._bins = 1
+        self.bit_depth = bit_depth
+        self.bins = bins
+
+    @property
+    def stride(self):
+        return self._stride
+
+    @stride.setter
+    def stride(self, value):
+        value = int(value)
+
+        if value < 1:
+            raise ValueError("Statistics stride {} is less than minimum value of 1.".format(value))
+
+        self._stride = value
+
+    @property
+    def bins(self):
+        return self._bins
+
+    @bins.setter
+    def bins(self, value):
+        value = int(value)
+
+        if value < 1:
+            raise ValueError("Number of histogram bins {} is less than minimum value of 1.".format(value))
+
+        self._bins = value
+        self.reset()
+
+    @property
+    def bit_depth(self):
+        return self._bit_depth
+
+    @bit_depth.setter
+    def bit_depth(self, value):
+        self._bit_depth = int(value)
+        self.saturation_level = 2 ** self._bit_depth - 1
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.edges = np.linspace(0, self.saturation_level + 1, self.bins + 1)
+        self.histogram = np.zeros(self.bins, dtype=np.int64)
+        self._scale = self.bins / (self.saturation_level + 1)
+
+    def update(self, frame):
+        sample = frame[::self.stride, ::self.stride]
+
+        # Bin index of every sampled pixel; values outside [0, saturation] go to the edge bins
+        if sample.dtype.kind == 'u' and self.bins & (self.bins - 1) == 0 and self.bins <= self.saturation_level + 1:
+            shift = self.bit_depth - (self.bins.bit_length() - 1)
+            index = np.right_shift(sample, shift).ravel()
+            np.minimum(index, self.bins - 1, out=index)
+        else:
+            index = (sample * self._scale).astype(np.intp).ravel()
+            np.clip(index, 0, self.bins - 1, out=index)
+
+        # Indices are clipped to the last bin, so the counts have exactly `bins` elements
+        self.histogram = np.bincount(index, minlength=self.bins)
+
+        minimum = sample.min()
+        maximum = sample.max()
+        if maximum >= self.saturation_level:
+            saturated = int(np.count_nonzero(sample >= self.saturation_level))
+        else:
+            saturated = 0
+
+        self.count += 1
+
+        return FrameStats(mean=float(sample.mean()),
+                          min=float(minimum),
+                          max=float(maximum),
+                          saturated=saturated,
+                          saturated_fraction=saturated / sample.size if sample.size else 0.,
+                          histogram=self.histogram,
+                          edges=self.edges,
+                          count=self.count)
+
+
+class ThrottledStatistics(FrameStatistics):
+    """
+    `FrameStatistics` que sólo procesa un cuadro cuando pasaron al menos `interval` segundos desde el último procesado.
+    `update` devuelve `None` para los cuadros salteados, de modo que el costo por cuadro es el de una llamada a
+    `perf_counter` salvo cuando hay que emitir un resultado.
+
+    Parameters
+    ----------
+    interval : float, opcional
+        Tiempo mínimo en segundos entre resultados (por defecto: 0.2).
+
+    Ver `FrameStatistics` para el resto de los parámetros.
+    """
+
+    def __init__(self, interval=0.2, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.interval = interval
+        self._last_update = None
+
+    def update(self, frame, now=None):
+        if now is None:
+            now = perf_counter()
+
+        if self._last_update is not None and now - self._last_update < self.interval:
+            return None
+
+        self._last_update = now
+
+        return super().update(frame)
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:05:37 2026
+
+@author: Axel Lacapmesure
+"""
+
+import numpy as np
+
+from collections import deque
+
+from enum import IntEnum
+
+from struct import Struct
+
+from threading import Thread, Condition, Lock
+
+from time import time
+
+import socket
+import os
+
+
+class Channels(IntEnum):
+    FRAME = 0
+    SPECTRUM = 1
+
+
+class DropPolicies(IntEnum):
+    CONFLATE = 0
+    DROP_OLDEST = 1
+    DROP_NEWEST = 2
+
+
+class StreamError(Exception):
+    """
+        Excepción cuando se recibe un mensaje inválido o la conexión se cierra.
+    """
+    pass
+
+
+MAGIC = b'UCST'
+VERSION = 1
+MAX_DIMS = 4
+
+# Client -> server: magic, version, channel mask, policy, queue length
+HELLO = Struct('<4sBBBxI')
+
+# Server -> client, followed by `nbytes` of raw little-endian array data:
+# magic, version, channel, dtype, ndim, sequence, timestamp, shape, nbytes
+HEADER = Struct('<4sBB4sB3xQd4IQ')
+
+
+def parse_address(address):
+    """
+    Interpreta una dirección como socket TCP (`(host, port)` o `'host:port'`) o como socket Unix (`'unix:/ruta'`).
+    Devuelve la familia de socket y la dirección en el formato que espera el módulo `socket`.
+    """
+    if isinstance(address, tuple):
+        return socket.AF_INET, address
+    elif address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    else:
+        host, port = address.rsplit(':', 1)
+        return socket.AF_INET, (host, int(port))
+
+
+def pack_message(channel, array, sequence, timestamp):
+    array = np.ascontiguousarray(array)
+
+    if array.dtype.byteorder == '>':
+        array = array.astype(array.dtype.newbyteorder('<'))
+    if array.ndim > MAX_DIMS:
+        raise ValueError("Arrays with more than {} dimensions cannot be streamed.".format(MAX_DIMS))
+
+    shape = tuple(array.shape) + (0,) * (MAX_DIMS - array.ndim)
+    dtype = array.dtype.str.replace('=', '<').replace('|', '<').encode()
+    header = HEADER.pack(MAGIC, VERSION, int(channel), dtype, array.ndim, sequence, timestamp, *shape, array.nbytes)
+
+    return header, array
+
+
+class _Subscriber:
+
+    def __init__(self, connection, channels, policy, queue_length):
+        self.connection = connection
+        self.channels = channels
+        self.policy = DropPolicies(policy)
+        self.queue_length = max(int(queue_length), 1)
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+
+        self._condition = Condition()
+        if self.policy == DropPolicies.CONFLATE:
+            self._latest = {}
+        else:
+            self._queue = deque()
+
+    def wants(self, channel):
+        return bool(self.channels & (1 << channel))
+
+    def put(self, channel, message):
+        with self._condition:
+            if self.policy == DropPolicies.CONFLATE:
+                if channel in self._latest:
+                    self.dropped += 1
+                self._latest[channel] = message
+            elif len(self._queue) >= self.queue_length:
+                self.dropped += 1
+                if self.policy == DropPolicies.DROP_OLDEST:
+                    self._queue.popleft()
+                    self._queue.append(message)
+            else:
+                self._queue.append(message)
+
+            self._condition.notify()
+
+    def _pending(self):
+        if self.policy == DropPolicies.CONFLATE:
+            return bool(self._latest)
+        return bool(self._queue)
+
+    def get(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or self._pending())
+
+            if self.closed:
+                return None
+            if self.policy == DropPolicies.CONFLATE:
+                channel = next(iter(self._latest))
+                return self._latest.pop(channel)
+            return self._queue.popleft()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def run(self):
+        try:
+            while True:
+                message = self.get()
+                if message is None:
+                    break
+
+                header, array = message
+                self.connection.sendall(header)
+                self.connection.sendall(memoryview(array).cast('B'))
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+
+class StreamServer:
+    """
+    Servidor local que publica cuadros y espectros en un formato binario compacto.
+
+    Cada mensaje consiste en un encabezado de tamaño fijo (`HEADER`) seguido de los datos crudos del array en
+    little-endian, sin pickling. Los clientes se conectan por TCP (preferentemente en localhost) o por un socket Unix
+    y envían un saludo (`HELLO`) indicando a qué canales se suscriben y qué política usar cuando no llegan a leer a
+    tiempo.
+
+    Parameters
+    ----------
+    address : Union[str, tuple]
+        Dirección de escucha: `'127.0.0.1:5555'`, `('127.0.0.1', 5555)` o `'unix:/tmp/uc480.sock'`.
+
+    Notes
+    -----
+    `publish` no hace entrada/salida: si hay suscriptores, copia una única vez el array (los cuadros de la cámara
+    apuntan a la memoria del driver, que se sobrescribe) y lo encola para cada cliente. Cada cliente tiene su propio
+    hilo de envío, de modo que un cliente lento nunca frena la adquisición ni a los demás clientes.
+
+    Políticas por cliente (`DropPolicies`):
+        CONFLATE: conserva sólo el mensaje más reciente de cada canal.
+        DROP_OLDEST: cola acotada; al llenarse se descarta el mensaje más viejo.
+        DROP_NEWEST: cola acotada; al llenarse se descarta el mensaje entrante.
+
+    Uso típico::
+
+        server = StreamServer('127.0.0.1:5555')
+        server.start()
+        server.connect_frames(control_be.new_data)
+        server.connect_spectra(spectra_be.new_data)
+    """
+
+    def __init__(self, address='127.0.0.1:5555'):
+        self.family, self.address = parse_address(address)
+        self.subscribers = []
+        self.running = False
+
+        self._socket = None
+        self._thread = None
+        self._lock = Lock()
+        self._sequences = {}
+
+    def start(self):
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.remove(self.address)
+
+        self._socket = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self.address)
+        self._socket.listen()
+
+        self.running = True
+        self._thread = Thread(target=self._accept, name='uc480-stream-server', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+
+        if self._socket is not None:
+            # shutdown() wakes the accept() call blocked in the server thread
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+
+        with self._lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def _accept(self):
+        while self.running:
+            try:
+                connection, _ = self._socket.accept()
+            except OSError:
+                break
+
+            try:
+                hello = self._receive_hello(connection)
+            except (OSError, StreamError):
+                connection.close()
+                continue
+
+            if self.family == socket.AF_INET:
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            _, _, channels, policy, queue_length = hello
+            subscriber = _Subscriber(connection, channels, policy, queue_length)
+            with self._lock:
+                self.subscribers.append(subscriber)
+            Thread(target=self._serve, args=(subscriber,), name='uc480-stream-client', daemon=True).start()
+
+    @staticmethod
+    def _receive_hello(connection):
+        connection.settimeout(5)
+        data = b''
+        while len(data) < HELLO.size:
+            chunk = connection.recv(HELLO.size - len(data))
+            if not chunk:
+                raise StreamError("Connection closed before hello message.")
+            data += chunk
+        connection.settimeout(None)
+
+        hello = HELLO.unpack(data)
+        if hello[0] != MAGIC or hello[1] != VERSION:
+            raise StreamError("Invalid hello message.")
+        DropPolicies(hello[3])
+
+        return hello
+
+    def _serve(self, subscriber):
+        subscriber.run()
+
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def publish(self, channel, array, timestamp=None):
+        subscribers = [subscriber for subscriber in tuple(self.subscribers) if subscriber.wants(channel)]
+        if not subscribers:
+            return None
+
+        if timestamp is None:
+            timestamp = time()
+
+        sequence = self._sequences.get(channel, 0)
+        self._sequences[channel] = sequence + 1
+
+        header, data = pack_message(channel, np.array(array, copy=True), sequence, timestamp)
+        for subscriber in subscribers:
+            subscriber.put(channel, (header, data))
+
+    # Both channels are stamped here with the same wall clock, so that clients can correlate them. Timestamps sent along
+    # by the signals (as the spectra analyzer's, on a monotonic clock) are ignored.
+    def publish_frame(self, frame, *args):
+        self.publish(Channels.FRAME, frame)
+
+    def publish_spectrum(self, spectrum, *args):
+        # Wavelength axis in the first row, processed intensity in the second
+        self.publish(Channels.SPECTRUM, np.vstack((spectrum.x, spectrum.y.reshape(-1))))
+
+    def connect_frames(self, signal):
+        signal.connect(self.publish_frame)
+
+    def connect_spectra(self, signal):
+        signal.connect(self.publish_spectrum)
+
+    @property
+    def dropped(self):
+        return sum(subscriber.dropped for subscriber in self.subscribers)
+
+
+class StreamClient:
+    """
+    Cliente para `StreamServer`. Sólo depende de numpy y de la biblioteca estándar, de modo que puede usarse desde
+    otro proceso sin instalar el driver de la cámara ni Qt.
+
+    Parameters
+    ----------
+    address : Union[str, tuple]
+        Dirección del servidor (ver `StreamServer`).
+    channels : iterable of Channels, opcional
+        Canales a los que se suscribe (por defecto: todos).
+    policy : DropPolicies, opcional
+        Política para cuando el cliente se atrasa (por defecto: CONFLATE).
+    queue_length : int, opcional
+        Largo de la cola del lado del servidor para las políticas DROP_OLDEST y DROP_NEWEST.
+
+    Notes
+    -----
+    `receive()` devuelve `(channel, sequence, timestamp, array)`. `timestamp` es la hora (`time.time()`, en segundos) a
+    la que el servidor publicó el mensaje, igual para todos los canales. Los saltos en `sequence` para un mismo canal
+    indican mensajes descartados por el servidor.
+    """
+
+    def __init__(self, address='127.0.0.1:5555', channels=None, policy=DropPolicies.CONFLATE, queue_length=4):
+        if channels is None:
+            channels = list(Channels)
+
+        family, address = parse_address(address)
+        self.connection = socket.socket(family, socket.SOCK_STREAM)
+        self.connection.connect(address)
+
+        mask = 0
+        for channel in channels:
+            mask |= 1 << int(channel)
+        self.connection.sendall(HELLO.pack(MAGIC, VERSION, mask, int(policy), int(queue_length)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _receive_into(self, buffer):
+        view = memoryview(buffer).cast('B')
+        received = 0
+        while received < len(view):
+            size = self.connection.recv_into(view[received:])
+            if size == 0:
+                raise StreamError("Connection closed by server.")
+            received += size
+
+    def receive(self):
+        header = bytearray(HEADER.size)
+        self._receive_into(header)
+
+        magic, version, channel, dtype, ndim, sequence, timestamp, *shape, nbytes = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise StreamError("Invalid message header.")
+
+        array = np.empty(tuple(shape[0:ndim]), dtype=np.dtype(dtype.rstrip(b'\0').decode()))
+        if array.nbytes != nbytes:
+            raise StreamError("Message size does not match array shape.")
+        if nbytes:
+            self._receive_into(array)
+
+        return channel, sequence, timestamp, array
+
+    def close(self):
+        self.connection.close()
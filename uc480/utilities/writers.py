@@ -0,0 +1,811 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:20:34 2026
+
+@author: Axel Lacapmesure
+"""
+
+import numpy as np
+
+from datetime import datetime
+
+from struct import Struct
+
+import json
+import os
+
+from .compression import get_codec
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+
+class FrameWriter:
+    """
+    Clase base para escritores de secuencias de cuadros en un único archivo.
+
+    Un escritor se abre sobre una ruta, recibe lotes de cuadros (un array de dimensiones `(n, alto, ancho)`) junto con
+    su metadata (un array estructurado de largo `n`, una fila por cuadro) mediante `write`, y libera el archivo con
+    `close`. Todos los cuadros de una secuencia deben tener la misma forma.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo.
+
+    Notes
+    -----
+    Las clases hijas implementan `_open(frames, metadata)`, que se llama con el primer lote (y por lo tanto conoce la
+    forma y el tipo de los cuadros), `_write(frames, metadata)` y `_close()`.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.count = 0
+        self.frame_shape = None
+        self.dtype = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, frames, metadata=None):
+        if self.closed:
+            raise ValueError("Cannot write to closed file '{}'.".format(self.path))
+
+        frames = np.asarray(frames)
+        if metadata is not None:
+            metadata = np.asarray(metadata).reshape(-1)
+            if len(metadata) != len(frames):
+                raise ValueError("Got {} metadata rows for {} frames.".format(len(metadata), len(frames)))
+
+        if self.frame_shape is None:
+            self.frame_shape = frames.shape[1:]
+            self.dtype = frames.dtype
+            self._open(frames, metadata)
+        elif frames.shape[1:] != self.frame_shape:
+            raise ValueError("Frame shape {} differs from shape {} of previous frames in '{}'.".format(
+                frames.shape[1:], self.frame_shape, self.path))
+
+        if len(frames):
+            self._write(frames, metadata)
+            self.count += len(frames)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self.frame_shape is not None:
+                self._close()
+
+    def _open(self, frames, metadata):
+        raise NotImplementedError
+
+    def _write(self, frames, metadata):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class HDF5FrameWriter(FrameWriter):
+    """
+    Escritor de secuencias de cuadros en un archivo HDF5 (requiere `h5py`).
+
+    Los cuadros se agregan a un dataset `frames` de dimensiones `(n, alto, ancho)`, redimensionable en el primer eje y
+    dividido en chunks de `chunk_frames` cuadros. Cada campo de la metadata se guarda como una columna independiente
+    (un dataset unidimensional de largo `n`) dentro del grupo `metadata`. Cada llamada a `write` redimensiona los
+    datasets una única vez y escribe el lote completo.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo. Si existe, se sobrescribe.
+    compression : str, opcional
+        Filtro de compresión de HDF5: 'gzip', 'lzf' o cualquier filtro registrado en h5py (por defecto: None, sin
+        compresión).
+    compression_opts : opcional
+        Parámetros del filtro (por ejemplo, el nivel de 0 a 9 para 'gzip').
+    shuffle : bool, opcional
+        Aplica el filtro de reordenamiento de bytes antes de comprimir, lo cual mejora la compresión de imágenes de
+        más de 8 bits (por defecto: True si hay compresión).
+    chunk_frames : int, opcional
+        Cantidad de cuadros por chunk. Por defecto, la necesaria para chunks de aproximadamente `CHUNK_BYTES` bytes.
+    attributes : dict, opcional
+        Atributos adicionales que se guardan en la raíz del archivo (por ejemplo, la configuración de la cámara).
+    """
+
+    CHUNK_BYTES = 2 ** 22
+
+    def __init__(self, path, compression=None, compression_opts=None, shuffle=None, chunk_frames=None,
+                 attributes=None):
+        if h5py is None:
+            raise ImportError("HDF5 files require the 'h5py' package.")
+
+        super().__init__(path)
+
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = bool(compression) if shuffle is None else shuffle
+        self.chunk_frames = chunk_frames
+        self.attributes = attributes if attributes else {}
+
+        self.file = h5py.File(self.path, 'w')
+        self.file.attrs['created'] = datetime.now().isoformat()
+        for key, value in self.attributes.items():
+            self.file.attrs[key] = value
+
+    def _open(self, frames, metadata):
+        chunk_frames = self.chunk_frames
+        if not chunk_frames:
+            chunk_frames = max(1, self.CHUNK_BYTES // max(frames[0:1].nbytes, 1))
+
+        filters = {}
+        if self.compression:
+            filters = {'compression': self.compression,
+                       'compression_opts': self.compression_opts,
+                       'shuffle': self.shuffle}
+
+        self.frames = self.file.create_dataset('frames',
+                                               shape=(0,) + self.frame_shape,
+                                               maxshape=(None,) + self.frame_shape,
+                                               chunks=(chunk_frames,) + self.frame_shape,
+                                               dtype=self.dtype,
+                                               **filters)
+
+        self.metadata = {}
+        if metadata is not None:
+            group = self.file.create_group('metadata')
+            for name in metadata.dtype.names:
+                # Sub-array fields (as an AOI) are stored as one column per element
+                field = metadata.dtype[name]
+                self.metadata[name] = group.create_dataset(name,
+                                                           shape=(0,) + field.shape,
+                                                           maxshape=(None,) + field.shape,
+                                                           chunks=(max(chunk_frames, 1024),) + field.shape,
+                                                           dtype=field.base)
+
+    def _write(self, frames, metadata):
+        start = self.count
+        stop = start + len(frames)
+
+        self.frames.resize(stop, axis=0)
+        self.frames[start:stop] = frames
+
+        if metadata is not None:
+            for name, column in self.metadata.items():
+                column.resize(stop, axis=0)
+                column[start:stop] = metadata[name]
+
+    def close(self):
+        super().close()
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class RawFrameWriter(FrameWriter):
+    """
+    Escritor de secuencias de cuadros como un flujo binario crudo, de sólo agregado, con un índice en un archivo
+    auxiliar.
+
+    Los bytes de cada lote de cuadros se agregan al final del archivo de datos con una única escritura, sin encabezados
+    ni conversiones, lo cual hace de este el modo de guardado más rápido. Por cada cuadro se agrega un registro de
+    tamaño fijo (`INDEX_DTYPE`) al archivo de índice `path + '.idx'`, con la posición del cuadro en el archivo de datos,
+    su forma, tipo de datos, timestamp y número de secuencia. El índice se escribe después de los datos, de modo que si
+    la grabación se interrumpe el índice nunca apunta a datos incompletos.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo de datos. Si existe, se sobrescribe.
+    codec : Union[str, Codec], opcional
+        Códec de compresión sin pérdida que se aplica a cada cuadro (ver `uc480.utilities.compression`). Por defecto,
+        None (sin compresión).
+
+    Notes
+    -----
+    Si la metadata tiene campos `timestamp` o `sequence`, se copian al índice. En caso contrario se usa NaN y el número
+    de cuadro dentro del archivo, respectivamente. Para leer una grabación ver `RawFrameReader`.
+
+    Con compresión, cada cuadro se comprime por separado y el campo `nbytes` del índice indica su tamaño comprimido,
+    de modo que el acceso aleatorio sigue siendo O(1) (pero requiere descomprimir el cuadro). El nombre del códec se
+    guarda en el encabezado del índice (a partir de la versión 2). Con `compress = False` los cuadros siguientes se
+    guardan sin comprimir aunque haya un códec; el campo `codec` del índice lo indica cuadro a cuadro (0: códec del
+    encabezado, 1: sin comprimir).
+    """
+
+    INDEX_EXTENSION = '.idx'
+    INDEX_MAGIC = b'UC480IDX'
+    INDEX_VERSION = 2
+    INDEX_HEADER = Struct('<8sII')
+    INDEX_CODEC = Struct('16s')
+    INDEX_DTYPE = np.dtype([('offset', '<u8'),
+                            ('nbytes', '<u8'),
+                            ('sequence', '<u8'),
+                            ('timestamp', '<f8'),
+                            ('dtype', 'S8'),
+                            ('ndim', 'u1'),
+                            ('codec', 'u1'),
+                            ('reserved', '<u2'),
+                            ('shape', '<u4', (4,))])
+
+    def __init__(self, path, codec=None):
+        super().__init__(path)
+
+        self.codec = get_codec(codec)
+        self.compress = True
+        self.index_path = self.path + self.INDEX_EXTENSION
+        self.offset = 0
+        self.bytes_in = 0
+
+        self.file = open(self.path, 'wb')
+        self.index_file = open(self.index_path, 'wb')
+        self.index_file.write(self.INDEX_HEADER.pack(self.INDEX_MAGIC, self.INDEX_VERSION, self.INDEX_DTYPE.itemsize))
+        self.index_file.write(self.INDEX_CODEC.pack(self.codec.label.encode()))
+
+    @property
+    def ratio(self):
+        return self.bytes_in / self.offset if self.offset else 1.
+
+    def _open(self, frames, metadata):
+        if frames.ndim - 1 > 4:
+            raise ValueError("Frames with more than 4 dimensions are not supported.")
+
+    def _write(self, frames, metadata):
+        frames = np.ascontiguousarray(frames)
+        index = np.zeros(len(frames), dtype=self.INDEX_DTYPE)
+
+        if self.codec.name == 'none' or not self.compress:
+            frame_bytes = frames[0].nbytes
+            self.file.write(memoryview(frames).cast('B'))
+            index['offset'] = self.offset + frame_bytes * np.arange(len(frames), dtype=np.uint64)
+            index['nbytes'] = frame_bytes
+            written = frames.nbytes
+            index['codec'] = self.codec.name != 'none'
+        else:
+            encoded = [self.codec.encode(frame) for frame in frames]
+            sizes = np.array([len(data) for data in encoded], dtype=np.uint64)
+            self.file.write(b''.join(encoded))
+            index['offset'] = self.offset + np.concatenate(([0], np.cumsum(sizes)[0:-1])).astype(np.uint64)
+            index['nbytes'] = sizes
+            written = int(sizes.sum())
+
+        index['dtype'] = frames.dtype.str.encode()
+        index['ndim'] = frames.ndim - 1
+        index['shape'][:, 0:frames.ndim - 1] = frames.shape[1:]
+
+        names = () if metadata is None else metadata.dtype.names
+        index['sequence'] = metadata['sequence'] if 'sequence' in names else self.count + np.arange(len(frames))
+        index['timestamp'] = metadata['timestamp'] if 'timestamp' in names else np.nan
+
+        self.index_file.write(index.tobytes())
+        self.offset += written
+        self.bytes_in += frames.nbytes
+
+    def flush(self):
+        self.file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        super().close()
+
+        if self.file is not None:
+            self.file.close()
+            self.index_file.close()
+            self.file = None
+            self.index_file = None
+
+
+class RawFrameReader:
+    """
+    Lector de grabaciones escritas con `RawFrameWriter`.
+
+    Tanto el índice como los datos se abren con `np.memmap`, por lo que abrir una grabación de varios GB no carga nada
+    en memoria y el acceso a cualquier cuadro es O(1): `reader[i]` devuelve una vista de sólo lectura del cuadro `i`
+    directamente sobre el archivo.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo de datos (el índice se busca en `path + '.idx'`).
+
+    Notes
+    -----
+    La cantidad de cuadros se calcula a partir del tamaño del índice, ignorando un posible registro incompleto al final,
+    de modo que pueden leerse grabaciones interrumpidas o todavía en curso (reabriendo el lector para ver los cuadros
+    nuevos).
+
+    En grabaciones comprimidas `reader[i]` devuelve una copia descomprimida del cuadro y `frames` no está disponible.
+
+    Ejemplo::
+
+        reader = RawFrameReader('frames.raw')
+        frame = reader[1000]
+        timestamps = reader.index['timestamp']
+        mean = reader.frames[::10].mean(axis=(1, 2))
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.index_path = self.path + RawFrameWriter.INDEX_EXTENSION
+
+        header = RawFrameWriter.INDEX_HEADER
+        with open(self.index_path, 'rb') as file:
+            magic, version, itemsize = header.unpack(file.read(header.size))
+            header_size = header.size
+
+            # Version 1 indices have no codec field and are never compressed
+            codec = 'none'
+            if version >= 2:
+                codec = RawFrameWriter.INDEX_CODEC.unpack(file.read(RawFrameWriter.INDEX_CODEC.size))[0]
+                codec = codec.rstrip(b'\0').decode()
+                header_size += RawFrameWriter.INDEX_CODEC.size
+
+        if magic != RawFrameWriter.INDEX_MAGIC or itemsize != RawFrameWriter.INDEX_DTYPE.itemsize:
+            raise ValueError("'{}' is not a valid frame index.".format(self.index_path))
+
+        self.codec = get_codec(codec)
+
+        length = (os.path.getsize(self.index_path) - header_size) // itemsize
+        if length:
+            self.index = np.memmap(self.index_path, dtype=RawFrameWriter.INDEX_DTYPE, mode='r', offset=header_size,
+                                   shape=(length,))
+            self.data = np.memmap(self.path, dtype=np.uint8, mode='r')
+        else:
+            self.index = np.zeros(0, dtype=RawFrameWriter.INDEX_DTYPE)
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, key):
+        if not isinstance(key, (int, np.integer)):
+            raise TypeError("Frames are indexed by integers. Use 'frames' for slices of uniform recordings.")
+
+        record = self.index[key]
+        offset = int(record['offset'])
+        shape = tuple(int(value) for value in record['shape'][0:record['ndim']])
+        dtype = np.dtype(record['dtype'].decode())
+        data = self.data[offset:offset + int(record['nbytes'])]
+
+        if self.codec.name != 'none' and not record['codec']:
+            return self.codec.decode(data, dtype, shape)
+
+        return data.view(dtype).reshape(shape)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def uniform(self):
+        index = self.index
+        return len(index) > 0 and bool(np.all(index['dtype'] == index['dtype'][0]) and
+                                       np.all(index['shape'] == index['shape'][0]))
+
+    @property
+    def frames(self):
+        """
+        Todos los cuadros como un único memmap de dimensiones `(n, alto, ancho)`. Sólo disponible si todos los cuadros
+        tienen la misma forma y tipo de datos.
+        """
+        if not self.uniform:
+            raise ValueError("Recording '{}' has frames of different shapes or types.".format(self.path))
+        if self.codec.name != 'none':
+            raise ValueError("Recording '{}' is compressed and cannot be memory-mapped as a whole.".format(self.path))
+
+        first = self[0]
+        return np.memmap(self.path, dtype=first.dtype, mode='r', shape=(len(self),) + first.shape)
+
+    def close(self):
+        self.index = None
+        self.data = None
+
+
+class TiffFrameWriter(FrameWriter):
+    """
+    Escritor de secuencias de cuadros en un único TIFF multipágina (requiere `tifffile`).
+
+    El archivo se mantiene abierto durante toda la grabación y cada cuadro se agrega como una página nueva. La metadata
+    de cada cuadro (por ejemplo, secuencia, timestamp y exposición) se guarda como JSON en la descripción
+    (ImageDescription) de su página.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo. Si existe, se sobrescribe.
+    bigtiff : bool, opcional
+        Fuerza el formato BigTIFF (True) o TIFF clásico (False). Por defecto (None), se usa TIFF clásico si
+        `expected_bytes` indica que el archivo no superará el límite de 4 GB y BigTIFF en caso contrario.
+    expected_bytes : int, opcional
+        Tamaño estimado de la grabación en bytes, para elegir el formato.
+
+    Notes
+    -----
+    Si un archivo TIFF clásico está por superar el límite de 4 GB (porque la estimación fue corta), se convierte a
+    BigTIFF: las páginas escritas hasta el momento se copian a un archivo BigTIFF nuevo, que reemplaza al original, y la
+    escritura continúa sobre este último. La conversión es lenta pero ocurre a lo sumo una vez por grabación.
+    """
+
+    # Classic TIFF offsets are 32 bits; leave room for page headers and descriptions
+    CLASSIC_LIMIT = 2 ** 32 - 2 ** 24
+
+    def __init__(self, path, bigtiff=None, expected_bytes=None):
+        if tifffile is None:
+            raise ImportError("TIFF stacks require the 'tifffile' package.")
+
+        super().__init__(path)
+
+        if bigtiff is None:
+            bigtiff = expected_bytes is None or expected_bytes > self.CLASSIC_LIMIT
+
+        self.bigtiff = bool(bigtiff)
+        self.bytes_written = 0
+        self.file = tifffile.TiffWriter(self.path, bigtiff=self.bigtiff)
+
+    def _open(self, frames, metadata):
+        pass
+
+    def _write_page(self, frame, description):
+        self.file.write(frame, photometric='minisblack', description=description, metadata=None,
+                        contiguous=False)
+        self.bytes_written += frame.nbytes + len(description) + 256
+
+    def _write(self, frames, metadata):
+        if not self.bigtiff and self.bytes_written + frames.nbytes > self.CLASSIC_LIMIT:
+            self.convert_to_bigtiff()
+
+        names = () if metadata is None else metadata.dtype.names
+        for index, frame in enumerate(frames):
+            fields = {name: metadata[index][name].tolist() for name in names}
+            fields['index'] = self.count + index
+            self._write_page(frame, json.dumps(fields))
+
+    def convert_to_bigtiff(self):
+        self.file.close()
+
+        classic_path = self.path + '.classic'
+        os.replace(self.path, classic_path)
+
+        self.bigtiff = True
+        self.bytes_written = 0
+        self.file = tifffile.TiffWriter(self.path, bigtiff=True)
+
+        if self.count:
+            with tifffile.TiffFile(classic_path) as classic:
+                for page in classic.pages:
+                    self._write_page(page.asarray(), page.description)
+
+        os.remove(classic_path)
+
+    def close(self):
+        super().close()
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TableWriter:
+    """
+    Escritor de tablas de metadata como un array estructurado de NumPy (`.npy`) que crece a medida que se agregan filas.
+
+    Las filas se acumulan en un bloque preasignado de `chunk_rows` filas y se agregan al final del archivo cuando el
+    bloque se llena, en `flush` y al cerrar. Después de cada escritura se actualiza la cantidad de filas en el
+    encabezado, cuyo largo es fijo, de modo que el archivo es siempre un `.npy` válido aunque la grabación se
+    interrumpa (con, a lo sumo, las filas del último bloque sin escribir).
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo. Si existe, se sobrescribe.
+    dtype : numpy.dtype
+        Tipo estructurado de las filas.
+    chunk_rows : int, opcional
+        Cantidad de filas que se acumulan antes de escribir (por defecto: 256).
+
+    Notes
+    -----
+    Para leer la tabla ver `read_table`. Como los campos se guardan en un array estructurado, una consulta sobre una
+    columna lee sólo esa columna con un memmap::
+
+        table = read_table('frames.meta.npy')
+        selected = table[table['exposure'] == 10.]['file']
+    """
+
+    SHAPE_WIDTH = 20
+
+    def __init__(self, path, dtype, chunk_rows=256):
+        self.path = str(path)
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.closed = False
+
+        self._chunk = np.zeros(int(chunk_rows), dtype=self.dtype)
+        self._filled = 0
+
+        self.file = open(self.path, 'wb')
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _write_header(self):
+        # Fixed-width shape, so the row count can be rewritten in place without moving the data
+        header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({:{}d},), }}".format(
+            np.lib.format.dtype_to_descr(self.dtype), self.count, self.SHAPE_WIDTH)
+        magic = np.lib.format.magic(1, 0)
+        padding = -(len(magic) + 2 + len(header) + 1) % 64
+        header = (header + ' ' * padding + '\n').encode('latin1')
+
+        self.file.seek(0)
+        self.file.write(magic + Struct('<H').pack(len(header)) + header)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, rows):
+        if self.closed:
+            raise ValueError("Cannot write to closed file '{}'.".format(self.path))
+
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1)
+        while len(rows):
+            size = min(len(rows), len(self._chunk) - self._filled)
+            self._chunk[self._filled:self._filled + size] = rows[0:size]
+            self._filled += size
+            rows = rows[size:]
+
+            if self._filled == len(self._chunk):
+                self.flush()
+
+    def flush(self):
+        if self._filled:
+            self.file.write(self._chunk[0:self._filled].tobytes())
+            self.count += self._filled
+            self._filled = 0
+            self._write_header()
+        self.file.flush()
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self.file.close()
+            self.closed = True
+
+
+class RecordingManifest:
+    """
+    Índice de una grabación dividida en segmentos (archivos) por rotación. Se guarda como JSON y describe, para cada
+    segmento, su archivo, la cantidad de muestras y de bytes, el índice de su primera muestra dentro de la grabación y
+    el rango de tiempo (timestamps en segundos desde la época) que cubre.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo del manifiesto. Los archivos de los segmentos se guardan relativos a su carpeta.
+
+    Notes
+    -----
+    El manifiesto se reescribe completo en cada `save` (a través de un archivo temporal y un reemplazo atómico), de modo
+    que nunca queda a medio escribir. Para leer una grabación::
+
+        manifest = RecordingManifest.load('frames_20240101_120000.manifest.json')
+        segment, offset = manifest.locate(timestamp=t)
+        reader = RawFrameReader(manifest.segment_path(segment))
+        frame = reader[offset]
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.segments = []
+
+    def __len__(self):
+        return len(self.segments)
+
+    @property
+    def items(self):
+        return sum(segment['items'] for segment in self.segments)
+
+    def begin_segment(self, path, first_item=0):
+        self.segments.append({'index': len(self.segments),
+                              'file': os.path.basename(str(path)),
+                              'first_item': int(first_item),
+                              'items': 0,
+                              'bytes': 0,
+                              'start': None,
+                              'end': None})
+
+        return self.segments[-1]
+
+    def update(self, items, nbytes, start, end):
+        segment = self.segments[-1]
+        segment['items'] += int(items)
+        segment['bytes'] += int(nbytes)
+        if segment['start'] is None:
+            segment['start'] = float(start)
+        segment['end'] = float(end)
+
+    def save(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'version': self.VERSION, 'segments': self.segments}, file, indent=1)
+        os.replace(temporary, self.path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as file:
+            content = json.load(file)
+
+        manifest = cls(path)
+        manifest.segments = content['segments']
+
+        return manifest
+
+    def segment_path(self, segment):
+        if isinstance(segment, int):
+            segment = self.segments[segment]
+
+        return os.path.join(os.path.dirname(self.path), segment['file'])
+
+    def locate(self, item=None, timestamp=None):
+        """
+        Devuelve el segmento que contiene la muestra número `item` de la grabación, o la primera muestra con timestamp
+        mayor o igual a `timestamp`, junto con su posición dentro del segmento. Por timestamp, la posición se estima
+        suponiendo muestras equiespaciadas dentro del segmento.
+        """
+        if item is not None:
+            for segment in self.segments:
+                if segment['first_item'] <= item < segment['first_item'] + segment['items']:
+                    return segment, item - segment['first_item']
+            raise IndexError("Item {} is not in the recording.".format(item))
+
+        for segment in self.segments:
+            if segment['end'] is not None and timestamp <= segment['end']:
+                if segment['items'] < 2 or timestamp <= segment['start']:
+                    return segment, 0
+                fraction = (timestamp - segment['start']) / (segment['end'] - segment['start'])
+                return segment, int(np.ceil(fraction * (segment['items'] - 1)))
+        raise IndexError("Timestamp {} is after the end of the recording.".format(timestamp))
+
+
+def read_table(path):
+    """
+    Abre una tabla escrita con `TableWriter` como un memmap de sólo lectura.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def write_text(path, data, fmt='%.18e', delimiter=' ', newline='\n', header='', comments='# ', chunk_values=2 ** 18):
+    """
+    Reemplazo de `np.savetxt` para arrays numéricos de una o dos dimensiones, con la misma salida.
+
+    En lugar de formatear valor por valor, cada bloque de aproximadamente `chunk_values` valores se convierte a texto
+    con operaciones vectorizadas y se escribe al archivo con una única llamada:
+
+    - Enteros con formato equivalente a `str` (por ejemplo, '%i' o '%0.1i'): cada valor distinto se formatea una única
+      vez en una tabla, y el texto del bloque se arma indexando la tabla con numpy.
+    - Resto de los casos: se arma una plantilla de formato para el bloque completo (la plantilla de una fila repetida)
+      y se formatea con una única operación `%`, que se resuelve en C.
+
+    Parameters
+    ----------
+    path : str
+        Ruta del archivo. Si existe, se sobrescribe.
+    data : array_like
+        Datos a guardar. Un array unidimensional se guarda como una columna.
+    fmt : str, opcional
+        Formato de cada valor, en el estilo de `%` (por defecto: '%.18e').
+    delimiter, newline, header, comments : str, opcional
+        Igual que en `np.savetxt`.
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    elif data.ndim != 2:
+        raise ValueError("Expected 1D or 2D array, got {}D array instead.".format(data.ndim))
+
+    rows, columns = data.shape
+    chunk_rows = max(1, chunk_values // max(columns, 1))
+
+    table = None
+    if len(delimiter) == 1 and len(newline) == 1 and _is_plain_integer_format(data, fmt):
+        if data.size and int(data.max()) - int(data.min()) < _IntegerTextTable.MAX_ENTRIES:
+            table = _IntegerTextTable(data, delimiter, newline)
+
+    row_template = delimiter.join([fmt] * columns) + newline
+    chunk_template = row_template * chunk_rows
+
+    with open(path, 'wb') as file:
+        if header:
+            file.write((comments + header.replace('\n', '\n' + comments) + newline).encode('latin1'))
+
+        for start in range(0, rows, chunk_rows):
+            chunk = data[start:start + chunk_rows]
+
+            if table is not None:
+                file.write(table.format(chunk))
+            else:
+                template = chunk_template if len(chunk) == chunk_rows else row_template * len(chunk)
+                file.write((template % tuple(chunk.ravel().tolist())).encode('latin1'))
+
+
+def _is_plain_integer_format(data, fmt):
+    if data.dtype.kind not in 'ui':
+        return False
+
+    try:
+        return all(fmt % value == str(value) for value in (0, 7, -12, 1234567))
+    except (TypeError, ValueError):
+        return False
+
+
+class _IntegerTextTable:
+    """
+    Tabla con la representación en texto de cada entero entre el mínimo y el máximo de los datos. Las filas de la tabla
+    tienen ancho fijo (alineadas a izquierda y completadas con ceros), más una columna final para el separador.
+    """
+
+    MAX_ENTRIES = 2 ** 20
+
+    def __init__(self, data, delimiter, newline):
+        self.minimum = int(data.min())
+        maximum = int(data.max())
+
+        strings = np.array([str(value) for value in range(self.minimum, maximum + 1)], dtype=np.bytes_)
+        self.width = strings.itemsize
+        self.codes = strings.view(np.uint8).reshape(len(strings), self.width)
+        self.lengths = np.char.str_len(strings)
+        self.delimiter = ord(delimiter)
+        self.newline = ord(newline)
+
+    def format(self, chunk):
+        index = chunk.astype(np.int64) - self.minimum
+        rows, columns = chunk.shape
+
+        text = np.empty((rows, columns, self.width + 1), dtype=np.uint8)
+        text[..., 0:self.width] = self.codes[index]
+        text[..., self.width] = self.delimiter
+        text[:, -1, self.width] = self.newline
+
+        mask = np.empty((rows, columns, self.width + 1), dtype=bool)
+        mask[..., 0:self.width] = np.arange(self.width) < self.lengths[index][..., np.newaxis]
+        mask[..., self.width] = True
+
+        return text[mask].tobytes()
+
+
+def read_hdf5_frames(path):
+    """
+    Lee un archivo escrito con `HDF5FrameWriter`. Devuelve los cuadros y un array estructurado con la metadata de cada
+    cuadro (o `None` si el archivo no tiene metadata). Para archivos grandes conviene abrirlo directamente con h5py y
+    leer sólo los cuadros necesarios.
+    """
+    if h5py is None:
+        raise ImportError("HDF5 files require the 'h5py' package.")
+
+    with h5py.File(path, 'r') as file:
+        frames = file['frames'][()]
+
+        metadata = None
+        if 'metadata' in file:
+            group = file['metadata']
+            names = list(group.keys())
+            metadata = np.zeros(len(frames), dtype=[(name, group[name].dtype, group[name].shape[1:]) for name in names])
+            for name in names:
+                metadata[name] = group[name][()]
+
+    return frames, metadata